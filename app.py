@@ -3,16 +3,23 @@ from dotenv import load_dotenv
 load_dotenv()
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
 from datetime import datetime, timedelta
 import time
+import logging
 
 from facebook_api import FacebookAPI
-from database import DatabaseManager
+from database import get_db
 from gemini_query import GeminiQueryEngine
 from utils import format_currency, format_percentage, validate_account_id
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# On-disk snapshots of fetched data, so a worker restart doesn't force a full re-fetch
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', '.cache')
+SNAPSHOT_TTL = 3600
+
 # Page configuration
 st.set_page_config(
     page_title="Facebook Ads Analytics",
@@ -31,6 +38,147 @@ if 'ads_df' not in st.session_state:
     st.session_state.ads_df = None
 if 'insights_df' not in st.session_state:
     st.session_state.insights_df = None
+if 'data_version' not in st.session_state:
+    st.session_state.data_version = None
+if 'spend_np' not in st.session_state:
+    st.session_state.spend_np = None
+if 'clicks_np' not in st.session_state:
+    st.session_state.clicks_np = None
+if 'impressions_np' not in st.session_state:
+    st.session_state.impressions_np = None
+
+def get_db_manager():
+    """Return the one DatabaseManager (and connection pool) shared across sessions"""
+    return get_db()
+
+@st.cache_resource
+def get_facebook_api():
+    """Create one FacebookAPI client shared across reruns and sessions"""
+    return FacebookAPI()
+
+@st.cache_resource
+def get_gemini_engine(_db_manager):
+    """Create one GeminiQueryEngine shared across reruns and sessions"""
+    return GeminiQueryEngine(_db_manager)
+
+def normalize_insights(insights_df):
+    """Cast insights metric and date columns to their numeric/datetime dtypes once at ingest"""
+    if insights_df.empty:
+        return insights_df
+    insights_df = insights_df.copy()
+    # The API client already types its frames; only re-parse columns that arrive as strings
+    if not pd.api.types.is_float_dtype(insights_df['spend']):
+        insights_df['spend'] = pd.to_numeric(insights_df['spend'], errors='coerce').fillna(0.0)
+    for col in ('clicks', 'impressions'):
+        values = insights_df[col]
+        if not pd.api.types.is_integer_dtype(values):
+            values = pd.to_numeric(values, errors='coerce').fillna(0)
+        insights_df[col] = pd.to_numeric(values, downcast='integer')
+    # The API returns ISO dates; an explicit format takes the fast strptime path
+    for col in ('date_start', 'date_stop'):
+        if col in insights_df.columns and not pd.api.types.is_datetime64_any_dtype(insights_df[col]):
+            insights_df[col] = pd.to_datetime(insights_df[col], format='%Y-%m-%d', errors='coerce', cache=True)
+    # Foreign keys repeat across rows; categorical codes make groupby/merge hash ints, not strings
+    for col in ('campaign_id', 'adset_id', 'ad_id'):
+        if col in insights_df.columns:
+            insights_df[col] = insights_df[col].astype('category')
+    return insights_df
+
+def snapshot_path(account_id, name):
+    """Path of the Parquet snapshot of one fetched dataset"""
+    return os.path.join(SNAPSHOT_DIR, f"{account_id}_{name}.parquet")
+
+def read_snapshot(account_id, name):
+    """Return a fresh Parquet snapshot of fetched data, or None if there is none"""
+    path = snapshot_path(account_id, name)
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < SNAPSHOT_TTL:
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"Failed to read snapshot {path}: {e}")
+    return None
+
+def write_snapshot(account_id, name, df):
+    """Write a Parquet snapshot of fetched data"""
+    path = snapshot_path(account_id, name)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        df.to_parquet(path, compression='snappy', index=False)
+    except Exception as e:
+        # Snapshots are best-effort; nested payload columns aren't always Parquet-representable
+        logger.warning(f"Failed to write snapshot {path}: {e}")
+
+@st.cache_data(ttl=SNAPSHOT_TTL, show_spinner=False)
+def cached_fetch_all(account_id, date_preset='last_30d'):
+    """Fetch campaigns, ad sets, ads and insights for an account, memoized across reruns
+    
+    Served from snapshots when all four are fresh; otherwise the client fetches every first page in
+    one batch call and the remaining pages concurrently.
+    """
+    names = {'campaigns': 'campaigns', 'adsets': 'adsets', 'ads': 'ads', 'insights': f'insights_{date_preset}'}
+    snapshots = {key: read_snapshot(account_id, name) for key, name in names.items()}
+    if all(df is not None for df in snapshots.values()):
+        return snapshots
+    
+    results = get_facebook_api().fetch_all(account_id, date_preset)
+    results['insights'] = normalize_insights(results['insights'])
+    for key, name in names.items():
+        write_snapshot(account_id, name, results[key])
+    return results
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_database_data(_db_manager):
+    """Load campaigns, ad sets, ads and insights from the database as DataFrames"""
+    return (
+        _db_manager.get_dataframe('campaigns'),
+        _db_manager.get_dataframe('adsets'),
+        _db_manager.get_dataframe('ads'),
+        normalize_insights(_db_manager.get_dataframe('insights'))
+    )
+
+def dataset_fingerprint(campaigns_df, adsets_df, ads_df, insights_df):
+    """Cheap fingerprint of the loaded dataset, used to key cached AI answers"""
+    parts = [df.shape for df in (campaigns_df, adsets_df, ads_df, insights_df)]
+    if not insights_df.empty:
+        parts.append(str(insights_df['date_start'].max()))
+        parts.append(round(float(insights_df['spend'].sum()), 2))
+    return repr(tuple(parts))
+
+@st.cache_data(show_spinner=False)
+def compute_aggregates(insights_df):
+    """Compute per-campaign aggregates of insights"""
+    campaign_agg = insights_df.groupby('campaign_id', observed=True, sort=False).agg(
+        spend=('spend', 'sum'),
+        clicks=('clicks', 'sum'),
+        impressions=('impressions', 'sum')
+    ).reset_index()
+    campaign_agg['ctr'] = campaign_agg['clicks'] / campaign_agg['impressions'] * 100
+    
+    return campaign_agg
+
+def compute_daily_insights(insights_df, keys=()):
+    """Sum spend, clicks and impressions per day of insights, and per each of the given key columns"""
+    return insights_df.groupby([*keys, 'date_start']).agg(
+        spend=('spend', 'sum'),
+        clicks=('clicks', 'sum'),
+        impressions=('impressions', 'sum')
+    ).reset_index().rename(columns={'date_start': 'date'})
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_daily_insights(_db_manager, account_ids, start_date, end_date, data_version):
+    """Load the daily totals of the given accounts and dates, memoized per dataset version"""
+    return _db_manager.get_daily_insights(account_ids, start_date, end_date)
+
+@st.cache_data(show_spinner=False)
+def compute_histogram(values, bins=50):
+    """Bin values server-side so charts send bin counts rather than every raw value"""
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    return (edges[:-1] + edges[1:]) / 2, counts
+
+def aggregate_insights(insights_df):
+    """Return cached per-campaign aggregates for the columns the overview reads"""
+    return compute_aggregates(insights_df[['campaign_id', 'spend', 'clicks', 'impressions']])
 
 def main():
     st.title("📊 Facebook Ads Analytics Platform")
@@ -38,9 +186,8 @@ def main():
     
     # Initialize components
     try:
-        db_manager = DatabaseManager()
-        facebook_api = FacebookAPI()
-        gemini_engine = GeminiQueryEngine(db_manager)
+        db_manager = get_db_manager()
+        gemini_engine = get_gemini_engine(db_manager)
     except Exception as e:
         st.error(f"Failed to initialize components: {str(e)}")
         st.stop()
@@ -49,34 +196,34 @@ def main():
     with st.sidebar:
         st.header("🔧 Configuration")
         
-        # Account ID input
-        account_id = st.text_input(
-            "Facebook Ads Account ID",
-            placeholder="act_1234567890",
-            help="Enter your Facebook Ads account ID (e.g., act_1234567890)"
-        )
-        
-        # Validate account ID
-        if account_id and not validate_account_id(account_id):
-            st.error("Invalid account ID format. Should start with 'act_' followed by numbers.")
-        
-        # Data fetching section
-        st.subheader("📥 Data Management")
-        
-        fetch_button = st.button(
-            "🔄 Fetch Fresh Data",
-            disabled=not account_id or not validate_account_id(account_id),
-            help="Fetch latest data from Facebook Marketing API"
-        )
+        # Account ID input and data actions; a form only reruns the script on submit
+        with st.form("data_source"):
+            account_id = st.text_input(
+                "Facebook Ads Account ID",
+                placeholder="act_1234567890",
+                help="Enter your Facebook Ads account ID (e.g., act_1234567890)"
+            )
+            
+            # Data fetching section
+            st.subheader("📥 Data Management")
+            
+            fetch_button = st.form_submit_button(
+                "🔄 Fetch Fresh Data",
+                help="Fetch latest data from Facebook Marketing API"
+            )
+            
+            # Load existing data button
+            load_button = st.form_submit_button(
+                "📂 Load Existing Data",
+                help="Load previously fetched data from database"
+            )
         
         if fetch_button:
-            fetch_facebook_data(account_id, facebook_api, db_manager)
-        
-        # Load existing data button
-        load_button = st.button(
-            "📂 Load Existing Data",
-            help="Load previously fetched data from database"
-        )
+            # Validate account ID
+            if not validate_account_id(account_id):
+                st.error("Invalid account ID format. Should start with 'act_' followed by numbers.")
+            else:
+                fetch_facebook_data(account_id, db_manager)
         
         if load_button:
             load_existing_data(db_manager)
@@ -92,6 +239,12 @@ def main():
                 st.metric("Ads", len(st.session_state.ads_df))
         else:
             st.info("💡 Fetch or load data to begin analysis")
+        
+        st.checkbox(
+            "Interactive Plotly charts",
+            key='use_plotly_charts',
+            help="Render dashboard charts with Plotly instead of Streamlit's lighter native charts"
+        )
     
     # Main content area
     if not st.session_state.data_fetched:
@@ -99,53 +252,56 @@ def main():
     else:
         show_analytics_dashboard(gemini_engine)
 
-def fetch_facebook_data(account_id, facebook_api, db_manager):
+def set_session_data(campaigns_df, adsets_df, ads_df, insights_df):
+    """Store a freshly fetched or loaded dataset in session state"""
+    st.session_state.campaigns_df = campaigns_df
+    st.session_state.adsets_df = adsets_df
+    st.session_state.ads_df = ads_df
+    st.session_state.insights_df = insights_df
+    
+    # Keep contiguous numpy copies of the hot metric columns for the totals
+    if not insights_df.empty:
+        st.session_state.spend_np = insights_df['spend'].to_numpy(dtype=np.float64)
+        st.session_state.clicks_np = insights_df['clicks'].to_numpy()
+        st.session_state.impressions_np = insights_df['impressions'].to_numpy()
+    else:
+        st.session_state.spend_np = np.zeros(0, dtype=np.float64)
+        st.session_state.clicks_np = np.zeros(0, dtype=np.int64)
+        st.session_state.impressions_np = np.zeros(0, dtype=np.int64)
+    
+    st.session_state.data_version = dataset_fingerprint(campaigns_df, adsets_df, ads_df, insights_df)
+    st.session_state.data_fetched = True
+
+def fetch_facebook_data(account_id, db_manager):
     """Fetch data from Facebook Marketing API and store in database"""
     with st.spinner("Fetching data from Facebook Marketing API..."):
         progress_bar = st.progress(0)
         status_text = st.empty()
         
         try:
-            # Fetch campaigns
-            status_text.text("Fetching campaigns...")
-            campaigns = facebook_api.fetch_campaigns(account_id)
-            progress_bar.progress(25)
-            
-            # Fetch ad sets
-            status_text.text("Fetching ad sets...")
-            adsets = facebook_api.fetch_adsets(account_id)
-            progress_bar.progress(50)
-            
-            # Fetch ads
-            status_text.text("Fetching ads...")
-            ads = facebook_api.fetch_ads(account_id)
-            progress_bar.progress(75)
-            
-            # Fetch insights
-            status_text.text("Fetching insights...")
-            insights = facebook_api.fetch_insights(account_id)
+            # First pages of all four resources in one batch call, then the remaining pages concurrently
+            status_text.text("Fetching campaigns, ad sets, ads and insights...")
+            results = cached_fetch_all(account_id)
             progress_bar.progress(90)
             
+            campaigns_df = results['campaigns']
+            adsets_df = results['adsets']
+            ads_df = results['ads']
+            insights_df = results['insights']
+            
             # Store in database
             status_text.text("Storing data in database...")
-            db_manager.store_campaigns(campaigns)
-            db_manager.store_adsets(adsets)
-            db_manager.store_ads(ads)
-            db_manager.store_insights(insights)
+            db_manager.store_all(campaigns_df, adsets_df, ads_df, insights_df)
+            if not insights_df.empty:
+                db_manager.store_daily_insights(compute_daily_insights(insights_df, ['account_id']))
+            load_database_data.clear()
             
             # Update session state
-            st.session_state.campaigns_df = pd.DataFrame(campaigns)
-            st.session_state.adsets_df = pd.DataFrame(adsets)
-            st.session_state.ads_df = pd.DataFrame(ads)
-            st.session_state.insights_df = pd.DataFrame(insights)
-            st.session_state.data_fetched = True
+            set_session_data(campaigns_df, adsets_df, ads_df, insights_df)
             
             progress_bar.progress(100)
             status_text.text("✅ Data fetched and stored successfully!")
             
-            time.sleep(1)
-            st.rerun()
-            
         except Exception as e:
             st.error(f"Error fetching data: {str(e)}")
             progress_bar.empty()
@@ -155,19 +311,11 @@ def load_existing_data(db_manager):
     """Load existing data from database"""
     try:
         with st.spinner("Loading data from database..."):
-            campaigns = db_manager.get_campaigns()
-            adsets = db_manager.get_adsets()
-            ads = db_manager.get_ads()
-            insights = db_manager.get_insights()
+            campaigns_df, adsets_df, ads_df, insights_df = load_database_data(db_manager)
             
-            if campaigns:
-                st.session_state.campaigns_df = pd.DataFrame(campaigns)
-                st.session_state.adsets_df = pd.DataFrame(adsets)
-                st.session_state.ads_df = pd.DataFrame(ads)
-                st.session_state.insights_df = pd.DataFrame(insights)
-                st.session_state.data_fetched = True
+            if not campaigns_df.empty:
+                set_session_data(campaigns_df, adsets_df, ads_df, insights_df)
                 st.success("Data loaded successfully from database!")
-                st.rerun()
             else:
                 st.warning("No data found in database. Please fetch fresh data first.")
                 
@@ -202,36 +350,55 @@ def show_welcome_screen():
 def show_analytics_dashboard(gemini_engine):
     """Display the main analytics dashboard"""
     
-    # Tabs for different views
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "🤖 AI Query", "📈 Performance", "📋 Raw Data"])
+    # Only the selected view is rendered; st.tabs would run every tab body on each rerun
+    active_tab = st.radio(
+        "View",
+        ["📊 Overview", "🤖 AI Query", "📈 Performance", "📋 Raw Data"],
+        horizontal=True,
+        key='active_tab',
+        label_visibility="collapsed"
+    )
     
-    with tab1:
+    if active_tab == "📊 Overview":
         show_overview_tab()
-    
-    with tab2:
+    elif active_tab == "🤖 AI Query":
         show_ai_query_tab(gemini_engine)
-    
-    with tab3:
+    elif active_tab == "📈 Performance":
         show_performance_tab()
-    
-    with tab4:
+    else:
         show_raw_data_tab()
 
+def render_chart(kind, data, x, y, title, labels):
+    """Draw a simple bar/line chart natively, or with Plotly when interactive charts are enabled"""
+    if st.session_state.get('use_plotly_charts'):
+        import plotly.express as px
+        
+        chart = px.bar if kind == 'bar' else px.line
+        fig = chart(data, x=x, y=y, title=title, labels=labels)
+        if kind == 'bar':
+            fig.update_layout(xaxis_tickangle=45)
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        chart = st.bar_chart if kind == 'bar' else st.line_chart
+        st.markdown(f"**{title}**")
+        chart(data, x=x, y=y, x_label=labels.get(x, x), y_label=labels.get(y, y))
+
+@st.fragment
 def show_overview_tab():
     """Display overview metrics and charts"""
     st.header("📊 Campaign Overview")
     
     if st.session_state.insights_df is not None and not st.session_state.insights_df.empty:
-        insights_df = st.session_state.insights_df
+        campaign_agg = aggregate_insights(st.session_state.insights_df)
+        
+        total_spend = float(st.session_state.spend_np.sum())
+        total_impressions = int(st.session_state.impressions_np.sum(dtype=np.int64))
+        total_clicks = int(st.session_state.clicks_np.sum(dtype=np.int64))
+        avg_ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
         
         # Key metrics
         col1, col2, col3, col4 = st.columns(4)
         
-        total_spend = insights_df['spend'].astype(float).sum()
-        total_impressions = insights_df['impressions'].astype(int).sum()
-        total_clicks = insights_df['clicks'].astype(int).sum()
-        avg_ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-        
         with col1:
             st.metric("Total Spend", format_currency(total_spend))
         with col2:
@@ -242,53 +409,38 @@ def show_overview_tab():
             st.metric("Average CTR", format_percentage(avg_ctr))
         
         # Charts
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Spend by campaign
-            if st.session_state.campaigns_df is not None:
-                campaign_spend = insights_df.groupby('campaign_id')['spend'].sum().reset_index()
-                campaign_spend = campaign_spend.merge(
-                    st.session_state.campaigns_df[['id', 'name']], 
-                    left_on='campaign_id', 
-                    right_on='id', 
-                    how='left'
-                )
-                
-                fig = px.bar(
-                    campaign_spend.head(10),
+        if st.session_state.campaigns_df is not None:
+            campaign_metrics = campaign_agg.merge(
+                st.session_state.campaigns_df[['id', 'name']].rename(columns={'id': 'campaign_id'}),
+                on='campaign_id',
+                how='left'
+            )
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                # Spend by campaign
+                render_chart(
+                    'bar',
+                    campaign_metrics.nlargest(10, 'spend'),
                     x='name',
                     y='spend',
                     title="Top 10 Campaigns by Spend",
                     labels={'spend': 'Spend (₹)', 'name': 'Campaign Name'}
                 )
-                fig.update_layout(xaxis_tickangle=45)
-                st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            # CTR by campaign
-            campaign_metrics = insights_df.groupby('campaign_id').agg({
-                'clicks': 'sum',
-                'impressions': 'sum'
-            }).reset_index()
-            campaign_metrics['ctr'] = (campaign_metrics['clicks'] / campaign_metrics['impressions'] * 100)
-            campaign_metrics = campaign_metrics.merge(
-                st.session_state.campaigns_df[['id', 'name']], 
-                left_on='campaign_id', 
-                right_on='id', 
-                how='left'
-            )
             
-            fig = px.bar(
-                campaign_metrics.head(10),
-                x='name',
-                y='ctr',
-                title="Top 10 Campaigns by CTR",
-                labels={'ctr': 'CTR (%)', 'name': 'Campaign Name'}
-            )
-            fig.update_layout(xaxis_tickangle=45)
-            st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                # CTR by campaign
+                render_chart(
+                    'bar',
+                    campaign_metrics.nlargest(10, 'ctr'),
+                    x='name',
+                    y='ctr',
+                    title="Top 10 Campaigns by CTR",
+                    labels={'ctr': 'CTR (%)', 'name': 'Campaign Name'}
+                )
 
+@st.fragment
 def show_ai_query_tab(gemini_engine):
     """Display AI-powered query interface"""
     st.header("🤖 AI-Powered Analytics")
@@ -310,27 +462,31 @@ def show_ai_query_tab(gemini_engine):
         - "Which campaigns are over or under-spending against daily budgets?"
         """)
     
-    # Query input
-    user_query = st.text_area(
-        "Enter your question:",
-        placeholder="e.g., Show me top 5 campaigns by spend",
-        height=100
-    )
-    
-    col1, col2 = st.columns([1, 4])
-    with col1:
-        query_button = st.button("🔍 Analyze", disabled=not user_query.strip())
+    # Query input; the form keeps typing from rerunning the tab until Analyze is pressed
+    with st.form("ai_query"):
+        user_query = st.text_area(
+            "Enter your question:",
+            placeholder="e.g., Show me top 5 campaigns by spend",
+            height=100
+        )
+        submitted = st.form_submit_button("🔍 Analyze")
     
-    if query_button and user_query.strip():
+    if submitted and user_query.strip():
         with st.spinner("Analyzing your query..."):
             try:
-                result = gemini_engine.process_query(user_query)
+                # Streamed so the AI text renders as it's generated; the engine caches finished answers
+                result = gemini_engine.process_query(user_query, stream=True)
                 
                 if result:
                     # Check if this is an analytical query
                     if result.get('query_type') == 'analytical':
                         st.subheader("🧠 AI Performance Analysis")
-                        st.markdown(result['insights'])
+                        if result.get('insights_stream'):
+                            st.write_stream(result['insights_stream'])
+                        elif result.get('insights'):
+                            st.info(result['insights'])
+                        elif result.get('error'):
+                            st.error(result['error'])
                         
                         # Show data summary if available
                         if result['data'] is not None and not result['data'].empty:
@@ -351,6 +507,8 @@ def show_ai_query_tab(gemini_engine):
                             if len(result['data']) > 1 and len(result['data'].columns) >= 2:
                                 numeric_cols = result['data'].select_dtypes(include=['number']).columns
                                 if len(numeric_cols) > 0:
+                                    import plotly.express as px
+                                    
                                     st.subheader("📈 Visualization")
                                     chart_type = st.selectbox("Chart Type", ["Bar Chart", "Line Chart"])
                                     
@@ -364,9 +522,9 @@ def show_ai_query_tab(gemini_engine):
                             st.info("No data returned for this query.")
                         
                         # Display AI insights
-                        if result.get('insights'):
+                        if result.get('insights_stream'):
                             st.subheader("🧠 AI Insights")
-                            st.markdown(result['insights'])
+                            st.write_stream(result['insights_stream'])
                             
                 else:
                     st.error("Failed to process query. Please try rephrasing your question.")
@@ -374,6 +532,7 @@ def show_ai_query_tab(gemini_engine):
             except Exception as e:
                 st.error(f"Error processing query: {str(e)}")
 
+@st.fragment
 def show_performance_tab():
     """Display performance analytics"""
     st.header("📈 Performance Analytics")
@@ -383,58 +542,68 @@ def show_performance_tab():
         
         # Performance over time
         if 'date_start' in insights_df.columns:
-            insights_df['date'] = pd.to_datetime(insights_df['date_start'])
-            daily_performance = insights_df.groupby('date').agg({
-                'spend': 'sum',
-                'impressions': 'sum',
-                'clicks': 'sum'
-            }).reset_index()
+            # Only the session's accounts and dates, so the trend matches the loaded insights
+            daily_performance = load_daily_insights(
+                get_db_manager(),
+                tuple(sorted(insights_df['account_id'].dropna().unique())),
+                insights_df['date_start'].min(),
+                insights_df['date_start'].max(),
+                st.session_state.data_version
+            )
+            if daily_performance.empty:
+                # Databases filled before the daily table existed
+                daily_performance = compute_daily_insights(insights_df)
             
             col1, col2 = st.columns(2)
             
             with col1:
-                fig = px.line(
+                render_chart(
+                    'line',
                     daily_performance,
                     x='date',
                     y='spend',
                     title="Daily Spend Trend",
                     labels={'spend': 'Spend (₹)', 'date': 'Date'}
                 )
-                st.plotly_chart(fig, use_container_width=True)
             
             with col2:
                 daily_performance['ctr'] = (daily_performance['clicks'] / daily_performance['impressions'] * 100)
-                fig = px.line(
+                render_chart(
+                    'line',
                     daily_performance,
                     x='date',
                     y='ctr',
                     title="Daily CTR Trend",
                     labels={'ctr': 'CTR (%)', 'date': 'Date'}
                 )
-                st.plotly_chart(fig, use_container_width=True)
         
         # Performance distribution
         col1, col2 = st.columns(2)
         
         with col1:
-            fig = px.histogram(
-                insights_df,
+            centers, counts = compute_histogram(insights_df['spend'].to_numpy(dtype='float64'))
+            render_chart(
+                'bar',
+                pd.DataFrame({'spend': centers, 'count': counts}),
                 x='spend',
+                y='count',
                 title="Spend Distribution",
-                labels={'spend': 'Spend (₹)'}
+                labels={'spend': 'Spend (₹)', 'count': 'Count'}
             )
-            st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            insights_df['ctr'] = (insights_df['clicks'].astype(int) / insights_df['impressions'].astype(int) * 100)
-            fig = px.histogram(
-                insights_df,
+            ctr = (insights_df['clicks'] / insights_df['impressions'] * 100)
+            centers, counts = compute_histogram(ctr.to_numpy(dtype='float64'))
+            render_chart(
+                'bar',
+                pd.DataFrame({'ctr': centers, 'count': counts}),
                 x='ctr',
+                y='count',
                 title="CTR Distribution",
-                labels={'ctr': 'CTR (%)'}
+                labels={'ctr': 'CTR (%)', 'count': 'Count'}
             )
-            st.plotly_chart(fig, use_container_width=True)
 
+@st.fragment
 def show_raw_data_tab():
     """Display raw data tables"""
     st.header("📋 Raw Data")
@@ -447,22 +616,37 @@ def show_raw_data_tab():
     
     if data_type == "Campaigns" and st.session_state.campaigns_df is not None:
         st.subheader("Campaigns Data")
-        st.dataframe(st.session_state.campaigns_df, use_container_width=True)
+        show_paginated_dataframe(st.session_state.campaigns_df, key='campaigns_df')
         
     elif data_type == "Ad Sets" and st.session_state.adsets_df is not None:
         st.subheader("Ad Sets Data")
-        st.dataframe(st.session_state.adsets_df, use_container_width=True)
+        show_paginated_dataframe(st.session_state.adsets_df, key='adsets_df')
         
     elif data_type == "Ads" and st.session_state.ads_df is not None:
         st.subheader("Ads Data")
-        st.dataframe(st.session_state.ads_df, use_container_width=True)
+        show_paginated_dataframe(st.session_state.ads_df, key='ads_df')
         
     elif data_type == "Insights" and st.session_state.insights_df is not None:
         st.subheader("Insights Data")
-        st.dataframe(st.session_state.insights_df, use_container_width=True)
+        show_paginated_dataframe(st.session_state.insights_df, key='insights_df')
     
     else:
         st.info("No data available. Please fetch or load data first.")
 
+def show_paginated_dataframe(df, key):
+    """Display one page of a DataFrame so only page_size rows are sent to the browser"""
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        page_size = st.select_slider("Rows per page", options=[50, 200, 1000], key=f"{key}_page_size")
+    
+    page_count = max(1, -(-len(df) // page_size))
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key=f"{key}_page")
+    
+    start = (page - 1) * page_size
+    st.dataframe(df.iloc[start:start + page_size], use_container_width=True)
+    st.caption(f"Showing rows {min(start + 1, len(df))}-{min(start + page_size, len(df))} of {len(df):,}")
+
 if __name__ == "__main__":
     main()
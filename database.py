@@ -1,45 +1,225 @@
 import os
 from dotenv import load_dotenv
-load_dotenv()
-import os
+# Deployments set DATABASE_URL in the environment; only local runs need the .env file read
+if os.getenv('DATABASE_URL') is None:
+    load_dotenv()
+import io
+import re
+import functools
+import csv
 import pandas as pd
-import json
-from sqlalchemy import create_engine, text, MetaData, Table, Column, String, Integer, Float, DateTime, Text
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+import orjson
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from sqlalchemy import create_engine, text, inspect, MetaData, Table, Column, Index, Enum, String, Integer, BigInteger, Float, DateTime, Text
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ENUM
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, OperationalError
+from psycopg2 import errors as pg_errors
 import uuid
 from datetime import datetime
+from urllib.parse import urlparse
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import threading
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+STATEMENT_TIMEOUT_MS = 30000
+IDLE_IN_TRANSACTION_TIMEOUT_MS = 60000
+
+# Column each table is listed by, newest first
+TABLE_ORDER_COLUMNS = {
+    'campaigns': 'created_time',
+    'adsets': 'created_time',
+    'ads': 'created_time',
+    'insights': 'date_start',
+    'daily_insights': 'date'
+}
+
+def _json_default(value):
+    """orjson fallback for values it can't serialize natively, e.g. object-dtype arrays from Parquet"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dump_json(value):
+    """Serialize a value to JSON text with orjson (numpy values included)"""
+    return orjson.dumps(value, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+# Configured and effective delivery statuses Facebook reports for campaigns, ad sets and ads
+AD_STATUSES = (
+    'ACTIVE', 'PAUSED', 'DELETED', 'ARCHIVED', 'IN_PROCESS', 'WITH_ISSUES',
+    'PENDING_REVIEW', 'DISAPPROVED', 'PREAPPROVED', 'PENDING_BILLING_INFO',
+    'CAMPAIGN_PAUSED', 'ADSET_PAUSED'
+)
+
+def is_id_column(column):
+    """Facebook object ids are stored as BIGINT but handled as text by the app"""
+    return column.name == 'id' or column.name.endswith('_id')
+
+def arrow_type(column):
+    """Arrow type a COPY CSV column is parsed as; ids and JSONB stay text (JSONB is decoded afterwards)"""
+    column_type = column.type
+    if is_id_column(column):
+        return pa.string()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+# Arrow type of each Postgres result type (by OID) an ad-hoc COPY result is parsed as; results with
+# any other column type (json, arrays, intervals, ...) are fetched through read_sql instead
+ARROW_TYPES_BY_OID = {
+    16: pa.bool_(),
+    20: pa.int64(), 21: pa.int64(), 23: pa.int64(),
+    700: pa.float64(), 701: pa.float64(), 1700: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp('us'), 1184: pa.timestamp('us', tz='UTC'),
+    18: pa.string(), 19: pa.string(), 25: pa.string(), 1042: pa.string(), 1043: pa.string()
+}
+
+# String literals (escape strings first), quoted identifiers, dollar-quoted strings and comments,
+# which are skipped when checking a query's statement structure
+SQL_OPAQUE_RE = re.compile(
+    r"(?<![\w$])[Ee]'(?:[^'\\]|''|\\.)*'"
+    r"|'(?:[^']|'')*'"
+    r'|"(?:[^"]|"")*"'
+    r"|(?<![\w$])\$((?:[A-Za-z_]\w*)?)\$.*?\$\1\$"
+    r"|--[^\n]*"
+    r"|/\*.*?\*/",
+    re.DOTALL
+)
+
+def is_single_statement(query):
+    """Whether query is one statement whose parentheses all balance, ignoring literals and comments
+    
+    SQL interpolated into a wrapper such as COPY (...) TO STDOUT could otherwise close the wrapper
+    with a stray ')' and append statements of its own after a ';'.
+    """
+    depth = 0
+    for char in SQL_OPAQUE_RE.sub(' ', query):
+        if char == ';':
+            return False
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+# psycopg2 batching for executemany() paths (pandas to_sql); bulk ingest itself goes through COPY.
+# The pool is shared by every Streamlit session and the fetch worker threads.
+# JIT is off per connection: LLVM compile time outweighs these small dashboard queries.
+# Statement and idle-transaction timeouts stop a runaway AI-generated query from pinning a pooled backend.
+# JSON/JSONB values bound or fetched through the engine go through orjson instead of the json module.
+ENGINE_OPTIONS = {
+    'json_serializer': dump_json,
+    'json_deserializer': orjson.loads,
+    'query_cache_size': 1200,
+    'connect_args': {
+        'options': (
+            f"-c statement_timeout={STATEMENT_TIMEOUT_MS} "
+            f"-c idle_in_transaction_session_timeout={IDLE_IN_TRANSACTION_TIMEOUT_MS} "
+            "-c jit=off"
+        )
+    },
+    'executemany_mode': 'values_plus_batch',
+    'insertmanyvalues_page_size': 1000,
+    'executemany_batch_page_size': 500,
+    'pool_size': 25,
+    'max_overflow': 25,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+    'pool_use_lifo': True
+}
+
+# Schema description handed to the AI query layer; constant, so built once and read-only
+SCHEMA_INFO = MappingProxyType({
+    'campaigns': {
+        'table': 'campaigns',
+        'columns': (
+            'id', 'account_id', 'name', 'status', 'objective',
+            'created_time', 'updated_time', 'start_time', 'stop_time',
+            'budget_remaining', 'daily_budget', 'lifetime_budget'
+        ),
+        'description': 'Facebook advertising campaigns data with campaign details'
+    },
+    'adsets': {
+        'table': 'adsets',
+        'columns': (
+            'id', 'account_id', 'campaign_id', 'name', 'status',
+            'optimization_goal', 'billing_event', 'bid_amount',
+            'daily_budget', 'lifetime_budget', 'start_time', 'end_time'
+        ),
+        'description': 'Facebook ad sets data linked to campaigns'
+    },
+    'ads': {
+        'table': 'ads',
+        'columns': (
+            'id', 'account_id', 'campaign_id', 'adset_id', 'name',
+            'status', 'created_time', 'updated_time'
+        ),
+        'description': 'Individual Facebook ads linked to campaigns and adsets'
+    },
+    'insights': {
+        'table': 'insights',
+        'columns': (
+            'id', 'account_id', 'date_start', 'date_stop', 
+            'impressions', 'clicks', 'spend', 'reach', 'frequency', 
+            'cpm', 'cpc', 'ctr', 'cpp'
+        ),
+        'description': 'Account-level performance metrics by date. NOTE: campaign_id, adset_id, ad_id are mostly NULL - this contains account-level aggregated data'
+    }
+})
+
+@functools.cache
+def get_schema_prompt():
+    """Schema description formatted as the prompt context the AI query layer sends"""
+    return ''.join(
+        f"\nTable: {table_info['table']}\n"
+        f"Description: {table_info['description']}\n"
+        f"Columns: {', '.join(table_info['columns'])}\n"
+        for table_info in SCHEMA_INFO.values()
+    )
+
 class DatabaseManager:
     def __init__(self):
         """Initialize database connection and create tables if they don't exist"""
         self.engine = self._create_engine()
+        # Same pool, but connections run in autocommit so read-only queries skip BEGIN/ROLLBACK round trips.
+        # Without a transaction to roll back, anything written would stick, so the session is also made
+        # read-only; SQLAlchemy restores both settings when connections go back to the pool
+        self.read_engine = self.engine.execution_options(isolation_level="AUTOCOMMIT", postgresql_readonly=True)
         self.metadata = MetaData()
         self._define_tables()
-        self._create_tables()
+        # Schema setup is on by default; set DB_AUTO_CREATE=0 where migrations own the schema
+        if os.getenv('DB_AUTO_CREATE', '1') == '1':
+            self._create_tables()
         
-        # Create session
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        # Session factory; use short-lived `with self.Session() as session:` blocks, never a shared session
+        self.Session = sessionmaker(bind=self.engine)
     
     def _create_engine(self):
         """Create database engine using environment variables"""
         try:
             # Try to get full DATABASE_URL first
             database_url = os.getenv('DATABASE_URL')
-            print("DEBUG: Using DATABASE_URL =", database_url)
-
+            if os.getenv('DB_DEBUG'):
+                # Logged at info: basicConfig sets the level to INFO, which would hide a debug record
+                logger.info("Using DATABASE_URL with host=%s", urlparse(database_url).hostname if database_url else None)
             
             if database_url:
                 # Handle postgres:// vs postgresql:// prefix
                 if database_url.startswith('postgres://'):
                     database_url = database_url.replace('postgres://', 'postgresql://', 1)
-                return create_engine(database_url)
+                return create_engine(database_url, **ENGINE_OPTIONS)
             
             # Fallback to individual components
             host = os.getenv('PGHOST', 'localhost')
@@ -49,7 +229,7 @@ class DatabaseManager:
             password = os.getenv('PGPASSWORD', '')
             
             connection_string = f"postgresql://{username}:{password}@{host}:{port}/{database}"
-            return create_engine(connection_string)
+            return create_engine(connection_string, **ENGINE_OPTIONS)
             
         except Exception as e:
             logger.error(f"Failed to create database engine: {e}")
@@ -58,14 +238,17 @@ class DatabaseManager:
     def _define_tables(self):
         """Define database table schemas"""
         
+        # One Postgres enum shared by every status column; bound to the metadata so dropping a table keeps it
+        self.ad_status_enum = Enum(*AD_STATUSES, name='ad_status_enum', metadata=self.metadata)
+        
         # Campaigns table
         self.campaigns_table = Table(
             'campaigns',
             self.metadata,
-            Column('id', String(50), primary_key=True),
+            Column('id', BigInteger, primary_key=True),
             Column('account_id', String(50), nullable=False),
             Column('name', String(255), nullable=False),
-            Column('status', String(50)),
+            Column('status', self.ad_status_enum),
             Column('objective', String(100)),
             Column('created_time', DateTime),
             Column('updated_time', DateTime),
@@ -82,11 +265,11 @@ class DatabaseManager:
         self.adsets_table = Table(
             'adsets',
             self.metadata,
-            Column('id', String(50), primary_key=True),
+            Column('id', BigInteger, primary_key=True),
             Column('account_id', String(50), nullable=False),
-            Column('campaign_id', String(50)),
+            Column('campaign_id', BigInteger),
             Column('name', String(255), nullable=False),
-            Column('status', String(50)),
+            Column('status', self.ad_status_enum),
             Column('optimization_goal', String(100)),
             Column('billing_event', String(100)),
             Column('bid_amount', Float),
@@ -104,12 +287,12 @@ class DatabaseManager:
         self.ads_table = Table(
             'ads',
             self.metadata,
-            Column('id', String(50), primary_key=True),
+            Column('id', BigInteger, primary_key=True),
             Column('account_id', String(50), nullable=False),
-            Column('campaign_id', String(50)),
-            Column('adset_id', String(50)),
+            Column('campaign_id', BigInteger),
+            Column('adset_id', BigInteger),
             Column('name', String(255), nullable=False),
-            Column('status', String(50)),
+            Column('status', self.ad_status_enum),
             Column('created_time', DateTime),
             Column('updated_time', DateTime),
             Column('data', JSONB),
@@ -117,15 +300,18 @@ class DatabaseManager:
         )
         
         # Insights table
+        # Partitioned by month of date_start (see _ensure_insights_partitions); Postgres requires the
+        # partition key in the primary key, so rows are keyed on (id, date_start). Ids are hashed from the
+        # row's account, objects and date (see FacebookAPI._insight_ids)
         self.insights_table = Table(
             'insights',
             self.metadata,
-            Column('id', String(50), primary_key=True),
+            Column('id', BigInteger, primary_key=True),
             Column('account_id', String(50), nullable=False),
-            Column('campaign_id', String(50)),
-            Column('adset_id', String(50)),
-            Column('ad_id', String(50)),
-            Column('date_start', DateTime),
+            Column('campaign_id', BigInteger),
+            Column('adset_id', BigInteger),
+            Column('ad_id', BigInteger),
+            Column('date_start', DateTime, primary_key=True),
             Column('date_stop', DateTime),
             Column('impressions', Integer),
             Column('clicks', Integer),
@@ -139,36 +325,236 @@ class DatabaseManager:
             Column('actions', JSONB),
             Column('cost_per_action_type', JSONB),
             Column('data', JSONB),
-            Column('inserted_at', DateTime, default=datetime.utcnow)
+            Column('inserted_at', DateTime, default=datetime.utcnow),
+            postgresql_partition_by='RANGE (date_start)'
         )
+        
+        # Daily insights table (per-account, per-day totals materialized at fetch time)
+        self.daily_insights_table = Table(
+            'daily_insights',
+            self.metadata,
+            Column('account_id', String(50), primary_key=True),
+            Column('date', DateTime, primary_key=True),
+            Column('spend', Float),
+            Column('clicks', Integer),
+            Column('impressions', Integer)
+        )
+        
+        # Indexes backing the get_* ORDER BY clauses and per-account / per-campaign lookups
+        for table in (self.campaigns_table, self.adsets_table, self.ads_table):
+            Index(f'ix_{table.name}_created_time', table.c.created_time.desc())
+            Index(f'ix_{table.name}_account_created', table.c.account_id, table.c.created_time.desc())
+        Index('ix_insights_date_start', self.insights_table.c.date_start.desc())
+        Index('ix_insights_campaign_date', self.insights_table.c.campaign_id, self.insights_table.c.date_start.desc())
+        
+        # GIN indexes so JSONB containment filters in AI-generated SQL can use an index scan
+        for table in (self.campaigns_table, self.adsets_table, self.ads_table, self.insights_table):
+            for col in table.columns:
+                if isinstance(col.type, JSONB):
+                    Index(
+                        f'ix_{table.name}_{col.name}_gin',
+                        col,
+                        postgresql_using='gin',
+                        postgresql_ops={col.name: 'jsonb_path_ops'}
+                    )
     
     def _create_tables(self):
         """Create tables if they don't exist"""
         try:
+            self._drop_outdated_tables()
             self.metadata.create_all(self.engine)
+            self._migrate_status_columns()
+            
+            # Keep the current and next month ready so ingest rarely has to add a partition
+            this_month = pd.Timestamp.now().to_period('M')
+            self._ensure_insights_partitions([this_month, this_month + 1])
+            
+            # create_all only adds indexes along with new tables; backfill them on existing ones
+            for table in self.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(self.engine, checkfirst=True)
             logger.info("Database tables created successfully")
         except Exception as e:
             logger.error(f"Failed to create tables: {e}")
             raise
     
-    def store_campaigns(self, campaigns_data):
-        """Store campaigns data in database"""
+    def _drop_outdated_tables(self):
+        """Drop tables whose stored layout no longer matches the declared one so they are recreated
+        
+        This covers tables left behind by pandas' to_sql(if_exists='replace'), which have no primary
+        key to upsert on, a changed primary key (e.g. insights before partitioning) and columns whose
+        type changed (e.g. text ids now stored as BIGINT). The tables only cache data re-fetched
+        from the Facebook API.
+        """
+        inspector = inspect(self.engine)
+        for table in (
+            self.campaigns_table, self.adsets_table, self.ads_table, self.insights_table, self.daily_insights_table
+        ):
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing_types = {col['name']: col['type'] for col in inspector.get_columns(table.name)}
+            existing_key = set(inspector.get_pk_constraint(table.name).get('constrained_columns') or [])
+            changed_key = existing_key != {col.name for col in table.primary_key.columns}
+            changed_types = any(
+                col.name in existing_types and not self._same_column_type(col.type, existing_types[col.name])
+                for col in table.columns
+            )
+            if changed_key or changed_types:
+                logger.warning(f"Recreating table {table.name} with its current schema")
+                table.drop(self.engine)
+    
+    @staticmethod
+    def _same_column_type(declared, reflected):
+        """Whether a reflected column type still matches the declared one
+        
+        A reflected Postgres ENUM never shares the declared Enum's type affinity, so enums match by
+        name; status columns still stored as text are converted in place by _migrate_status_columns.
+        """
+        if isinstance(declared, Enum):
+            if isinstance(reflected, ENUM):
+                return reflected.name == declared.name
+            return isinstance(reflected, String)
+        return reflected._type_affinity is declared._type_affinity
+    
+    def _ensure_insights_partitions(self, months):
+        """Create the monthly insights partitions for the given pandas Periods if they don't exist"""
+        with self.engine.begin() as connection:
+            for month in sorted(set(months)):
+                start = month.start_time.strftime('%Y-%m-%d')
+                end = (month + 1).start_time.strftime('%Y-%m-%d')
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS insights_{month.strftime('%Y_%m')} "
+                    f"PARTITION OF insights FOR VALUES FROM ('{start}') TO ('{end}')"
+                ))
+    
+    def _migrate_status_columns(self):
+        """Convert status columns still stored as text to the ad_status_enum type"""
+        inspector = inspect(self.engine)
+        statuses = ', '.join(f"'{status}'" for status in AD_STATUSES)
+        with self.engine.begin() as connection:
+            for table in (self.campaigns_table, self.adsets_table, self.ads_table):
+                existing_types = {col['name']: col['type'] for col in inspector.get_columns(table.name)}
+                if isinstance(existing_types.get('status'), ENUM):
+                    continue
+                
+                logger.info(f"Converting {table.name}.status to ad_status_enum")
+                connection.execute(text(f"UPDATE {table.name} SET status = NULL WHERE status NOT IN ({statuses})"))
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} ALTER COLUMN status TYPE ad_status_enum USING status::ad_status_enum"
+                ))
+    
+    def _serialize_json_columns(self, df, columns):
+        """Serialize dict/list columns to JSON text for the JSONB columns, without pandas' per-element apply"""
+        for col in columns:
+            if col in df.columns:
+                values = df[col].tolist()
+                # Identity checks: `in` compares with ==, which is ambiguous for ndarray payloads
+                if any(value is None for value in values):
+                    serialized = list(map(lambda x: dump_json(x) if x is not None else None, values))
+                else:
+                    # Common case: every row has a payload, so map straight onto the serializer
+                    serialized = list(map(dump_json, values))
+                df = df.assign(**{col: serialized})
+        return df
+    
+    def _dataframe_to_csv(self, table, df):
+        """Render a DataFrame's table columns as a CSV buffer for COPY"""
+        key_columns = [col.name for col in table.primary_key.columns]
+        columns = [col.name for col in table.columns if col.name in df.columns]
+        df = df[columns].drop_duplicates(subset=key_columns, keep='last')
+        df = self._serialize_json_columns(df, [col for col in columns if isinstance(table.c[col].type, JSONB)])
+        
+        # Statuses outside the enum would fail the whole COPY; store them as NULL (the raw payload keeps them)
+        for col in columns:
+            if isinstance(table.c[col].type, Enum):
+                df = df.assign(**{col: df[col].where(df[col].isin(table.c[col].type.enums))})
+        
+        # COPY rejects '1.0' for integer columns, which NaN-holding int columns turn into
+        for col in columns:
+            if isinstance(table.c[col].type, Integer) and not is_id_column(table.c[col]):
+                df = df.assign(**{col: df[col].astype('Int64')})
+        
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        return columns, buffer
+    
+    def _records_to_csv(self, table, records):
+        """Render a list of dicts as a CSV buffer for COPY, without building a DataFrame"""
+        key_columns = [col.name for col in table.primary_key.columns]
+        columns = [col.name for col in table.columns if col.name in records[0]]
+        # Positions needing a transform are resolved once, so plain columns are copied without per-value checks
+        json_positions = [i for i, col in enumerate(columns) if isinstance(table.c[col].type, JSONB)]
+        enum_positions = [
+            (i, set(table.c[col].type.enums)) for i, col in enumerate(columns) if isinstance(table.c[col].type, Enum)
+        ]
+        
+        # Later records win, as ON CONFLICT cannot touch the same row twice in one statement
+        unique_records = {tuple(record.get(col) for col in key_columns): record for record in records}
+        
+        buffer = io.StringIO()
+        writerow = csv.writer(buffer).writerow
+        dump = dump_json
+        for record in unique_records.values():
+            get = record.get
+            row = [get(col) for col in columns]
+            for i in json_positions:
+                if row[i] is not None:
+                    row[i] = dump(row[i])
+            for i, allowed in enum_positions:
+                if row[i] not in allowed:
+                    row[i] = None
+            writerow(row)
+        return columns, buffer
+    
+    def _upsert(self, table, data):
+        """Bulk upsert a DataFrame or list of dicts: COPY into a temp staging table, then INSERT ... ON CONFLICT"""
+        if len(data) == 0:
+            return
+        
+        if isinstance(data, pd.DataFrame):
+            columns, buffer = self._dataframe_to_csv(table, data)
+        else:
+            columns, buffer = self._records_to_csv(table, data)
+        buffer.seek(0)
+        
+        key_columns = [col.name for col in table.primary_key.columns]
+        column_list = ', '.join(f'"{col}"' for col in columns)
+        update_list = ', '.join(f'"{col}" = EXCLUDED."{col}"' for col in columns if col not in key_columns)
+        key_list = ', '.join(f'"{col}"' for col in key_columns)
+        staging = f"stg_{table.name}"
+        
+        connection = self.engine.raw_connection()
         try:
-            # Convert to DataFrame for easier handling
-            df = pd.DataFrame(campaigns_data)
+            cursor = connection.cursor()
+            # Bulk ingest is trusted and sized by the fetch; the statement timeout is for ad-hoc queries
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP")
+            cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT CSV)", buffer)
             
-            # Convert 'data' column to JSON string if it exists
-            if 'data' in df.columns:
-                df['data'] = df['data'].apply(lambda x: json.dumps(x) if x is not None else None)
+            insert_columns = column_list
+            select_columns = column_list
+            if 'inserted_at' in table.c and 'inserted_at' not in columns:
+                insert_columns += ', "inserted_at"'
+                select_columns += ", timezone('utc', now())"
             
-            # Upsert data
-            df.to_sql(
-                'campaigns',
-                self.engine,
-                if_exists='replace',
-                index=False,
-                dtype={'data': JSONB}
+            conflict_action = f"DO UPDATE SET {update_list}" if update_list else "DO NOTHING"
+            cursor.execute(
+                f"INSERT INTO {table.name} ({insert_columns}) "
+                f"SELECT {select_columns} FROM {staging} "
+                f"ON CONFLICT ({key_list}) {conflict_action}"
             )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+    
+    def store_campaigns(self, campaigns_data):
+        """Store campaigns (list of dicts or DataFrame) in database"""
+        try:
+            self._upsert(self.campaigns_table, campaigns_data)
             
             logger.info(f"Stored {len(campaigns_data)} campaigns")
             
@@ -177,21 +563,9 @@ class DatabaseManager:
             raise
     
     def store_adsets(self, adsets_data):
-        """Store ad sets data in database"""
+        """Store ad sets (list of dicts or DataFrame) in database"""
         try:
-            df = pd.DataFrame(adsets_data)
-            
-            # Convert 'data' column to JSON string if it exists
-            if 'data' in df.columns:
-                df['data'] = df['data'].apply(lambda x: json.dumps(x) if x is not None else None)
-            
-            df.to_sql(
-                'adsets',
-                self.engine,
-                if_exists='replace',
-                index=False,
-                dtype={'data': JSONB}
-            )
+            self._upsert(self.adsets_table, adsets_data)
             
             logger.info(f"Stored {len(adsets_data)} ad sets")
             
@@ -200,21 +574,9 @@ class DatabaseManager:
             raise
     
     def store_ads(self, ads_data):
-        """Store ads data in database"""
+        """Store ads (list of dicts or DataFrame) in database"""
         try:
-            df = pd.DataFrame(ads_data)
-            
-            # Convert 'data' column to JSON string if it exists
-            if 'data' in df.columns:
-                df['data'] = df['data'].apply(lambda x: json.dumps(x) if x is not None else None)
-            
-            df.to_sql(
-                'ads',
-                self.engine,
-                if_exists='replace',
-                index=False,
-                dtype={'data': JSONB}
-            )
+            self._upsert(self.ads_table, ads_data)
             
             logger.info(f"Stored {len(ads_data)} ads")
             
@@ -223,29 +585,17 @@ class DatabaseManager:
             raise
     
     def store_insights(self, insights_data):
-        """Store insights data in database"""
+        """Store insights (list of dicts or DataFrame) in database"""
         try:
-            df = pd.DataFrame(insights_data)
+            if len(insights_data) > 0:
+                if isinstance(insights_data, pd.DataFrame):
+                    dates = insights_data['date_start']
+                else:
+                    dates = [insight.get('date_start') for insight in insights_data]
+                months = pd.to_datetime(pd.Series(dates), errors='coerce').dropna().dt.to_period('M')
+                self._ensure_insights_partitions(months.unique())
             
-            # Convert JSON columns to JSON strings
-            json_columns = ['actions', 'cost_per_action_type', 'data']
-            for col in json_columns:
-                if col in df.columns:
-                    df[col] = df[col].apply(lambda x: json.dumps(x) if x is not None else None)
-            
-            # Define dtype mapping for JSONB columns
-            dtype_mapping = {}
-            for col in json_columns:
-                if col in df.columns:
-                    dtype_mapping[col] = JSONB
-            
-            df.to_sql(
-                'insights',
-                self.engine,
-                if_exists='replace',
-                index=False,
-                dtype=dtype_mapping
-            )
+            self._upsert(self.insights_table, insights_data)
             
             logger.info(f"Stored {len(insights_data)} insights")
             
@@ -253,100 +603,246 @@ class DatabaseManager:
             logger.error(f"Failed to store insights: {e}")
             raise
     
-    def get_campaigns(self):
-        """Retrieve campaigns from database"""
+    def store_all(self, campaigns_data, adsets_data, ads_data, insights_data):
+        """Store all four entity sets concurrently, each over its own pooled connection"""
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                executor.submit(self.store_campaigns, campaigns_data),
+                executor.submit(self.store_adsets, adsets_data),
+                executor.submit(self.store_ads, ads_data),
+                executor.submit(self.store_insights, insights_data)
+            ]
+            # Re-raise the first failure once every write has finished
+            for future in futures:
+                future.result()
+    
+    def store_daily_insights(self, daily_df):
+        """Store per-account, per-day insight totals in database, replacing the days they cover"""
         try:
-            query = "SELECT * FROM campaigns ORDER BY created_time DESC"
-            df = pd.read_sql(query, self.engine)
-            return df.to_dict('records')
+            self._upsert(self.daily_insights_table, daily_df)
+            
+            logger.info(f"Stored {len(daily_df)} daily insight rows")
+            
         except Exception as e:
-            logger.error(f"Failed to retrieve campaigns: {e}")
-            return []
+            logger.error(f"Failed to store daily insights: {e}")
+            raise
     
-    def get_adsets(self):
-        """Retrieve ad sets from database"""
+    def _copy_out(self, table, columns):
+        """COPY the selected columns out as CSV and parse them column-wise with pyarrow"""
+        column_list = ', '.join(f'"{col.name}"' for col in columns)
+        query = (
+            f"COPY (SELECT {column_list} FROM {table.name} ORDER BY {TABLE_ORDER_COLUMNS[table.name]} DESC) "
+            f"TO STDOUT WITH (FORMAT CSV, HEADER)"
+        )
+        
+        buffer = io.BytesIO()
+        with self.read_engine.connect() as connection:
+            connection.connection.cursor().copy_expert(query, buffer)
+        buffer.seek(0)
+        
+        # COPY writes NULL unquoted and empty strings quoted, so only unquoted empties become nulls
+        convert_options = pa_csv.ConvertOptions(
+            column_types={col.name: arrow_type(col) for col in columns},
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False
+        )
+        df = pa_csv.read_csv(buffer, convert_options=convert_options).to_pandas()
+        
+        for col in columns:
+            if isinstance(col.type, JSONB):
+                df[col.name] = [orjson.loads(x) if x is not None else None for x in df[col.name].values]
+        return df
+    
+    def get_dataframe(self, table_name, include_raw=False):
+        """Retrieve a table from database as a DataFrame, read through COPY instead of row-by-row fetches
+        
+        The raw API payload in the JSONB 'data' column is skipped unless include_raw is set.
+        """
         try:
-            query = "SELECT * FROM adsets ORDER BY created_time DESC"
-            df = pd.read_sql(query, self.engine)
-            return df.to_dict('records')
+            table = self.metadata.tables[table_name]
+            columns = [col for col in table.columns if include_raw or col.name != 'data']
+            return self._copy_out(table, columns)
         except Exception as e:
-            logger.error(f"Failed to retrieve ad sets: {e}")
-            return []
+            logger.error(f"Failed to retrieve {table_name}: {e}")
+            return pd.DataFrame()
+    
+    def iter_rows(self, table_name, include_raw=False, batch_size=10000):
+        """Yield a table's rows as dicts, streamed in batches without building a DataFrame
+        
+        Ids are yielded as text, as get_dataframe returns them.
+        """
+        table = self.metadata.tables[table_name]
+        columns = [col for col in table.columns if include_raw or col.name != 'data']
+        names = [col.name for col in columns]
+        id_positions = [i for i, col in enumerate(columns) if is_id_column(col)]
+        query = (
+            f"SELECT {', '.join(names)} FROM {table_name} "
+            f"ORDER BY {TABLE_ORDER_COLUMNS[table_name]} DESC"
+        )
+        
+        # A WITH HOLD cursor outlives its (autocommit) transaction, so a slow consumer holds no open
+        # transaction for idle_in_transaction_session_timeout to kill; rows still arrive in batches
+        with self.read_engine.connect() as connection:
+            cursor = connection.connection.cursor(name=f"iter_{table_name}_{uuid.uuid4().hex}", withhold=True)
+            try:
+                cursor.execute(query)
+                for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+                    for row in rows:
+                        row = list(row)
+                        for i in id_positions:
+                            if row[i] is not None:
+                                row[i] = str(row[i])
+                        yield dict(zip(names, row))
+            finally:
+                cursor.close()
+    
+    def get_campaigns(self):
+        """Retrieve campaigns from database as an iterator of row dicts"""
+        return self.iter_rows('campaigns')
+    
+    def get_adsets(self):
+        """Retrieve ad sets from database as an iterator of row dicts"""
+        return self.iter_rows('adsets')
     
     def get_ads(self):
-        """Retrieve ads from database"""
-        try:
-            query = "SELECT * FROM ads ORDER BY created_time DESC"
-            df = pd.read_sql(query, self.engine)
-            return df.to_dict('records')
-        except Exception as e:
-            logger.error(f"Failed to retrieve ads: {e}")
-            return []
+        """Retrieve ads from database as an iterator of row dicts"""
+        return self.iter_rows('ads')
     
     def get_insights(self):
-        """Retrieve insights from database"""
+        """Retrieve insights from database as an iterator of row dicts"""
+        return self.iter_rows('insights')
+    
+    def get_daily_insights(self, account_ids, start_date, end_date):
+        """Retrieve per-day insight totals of the given accounts between two dates, oldest day first"""
         try:
-            query = "SELECT * FROM insights ORDER BY date_start DESC"
-            df = pd.read_sql(query, self.engine)
-            return df.to_dict('records')
+            return self.execute_query(
+                """
+                SELECT date, SUM(spend) AS spend, SUM(clicks) AS clicks, SUM(impressions) AS impressions
+                FROM daily_insights
+                WHERE account_id = ANY(:account_ids) AND date BETWEEN :start_date AND :end_date
+                GROUP BY date
+                ORDER BY date
+                """,
+                params={'account_ids': list(account_ids), 'start_date': start_date, 'end_date': end_date}
+            )
         except Exception as e:
-            logger.error(f"Failed to retrieve insights: {e}")
-            return []
+            logger.error(f"Failed to retrieve daily insights: {e}")
+            return pd.DataFrame()
     
-    def execute_query(self, query):
-        """Execute a custom SQL query and return results as DataFrame"""
+    def execute_query(self, query, params=None):
+        """Execute a custom SQL query and return results as DataFrame
+        
+        Pass values through params (bound as :name) rather than formatting them into the SQL,
+        so repeated templates hit SQLAlchemy's compiled statement cache.
+        """
         try:
-            df = pd.read_sql(text(query), self.engine)
+            df = pd.read_sql(text(query), self.read_engine, params=params)
             return df
+        except OperationalError as e:
+            if isinstance(e.orig, pg_errors.QueryCanceled):
+                logger.warning(f"Query cancelled by statement timeout: {query}")
+                raise TimeoutError(f"Query took longer than {STATEMENT_TIMEOUT_MS // 1000} seconds and was cancelled") from e
+            logger.error(f"Failed to execute query: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Failed to execute query: {e}")
+            raise
+    
+    def execute_query_arrow(self, query):
+        """Execute a read-only SELECT through COPY and parse the result column-wise with pyarrow
+        
+        Avoids building a Python tuple per row, which dominates read_sql on larger results. Column types
+        come from the query's own result description, so text stays text; results with types that have
+        no Arrow mapping, or that pyarrow can't parse, fall back to execute_query.
+        """
+        query = query.strip().rstrip(';').rstrip()
+        if not is_single_statement(query):
+            raise ValueError("Only a single SELECT statement can be executed")
+        
+        buffer = io.BytesIO()
+        try:
+            with self.read_engine.connect() as connection:
+                cursor = connection.connection.cursor()
+                # The newline keeps a trailing line comment in the query from swallowing the wrapper
+                cursor.execute(f"SELECT * FROM ({query}\n) AS result LIMIT 0")
+                names = [column.name for column in cursor.description]
+                types = [ARROW_TYPES_BY_OID.get(column.type_code) for column in cursor.description]
+                if None in types or len(set(names)) != len(names):
+                    buffer = None
+                else:
+                    cursor.copy_expert(f"COPY ({query}\n) TO STDOUT WITH (FORMAT CSV, HEADER)", buffer)
+        except pg_errors.QueryCanceled as e:
+            logger.warning(f"Query cancelled by statement timeout: {query}")
+            raise TimeoutError(f"Query took longer than {STATEMENT_TIMEOUT_MS // 1000} seconds and was cancelled") from e
         except Exception as e:
             logger.error(f"Failed to execute query: {e}")
             raise
+        if buffer is None:
+            return self.execute_query(query)
+        buffer.seek(0)
+        
+        # COPY writes NULL unquoted and empty strings quoted, so only unquoted empties become nulls
+        convert_options = pa_csv.ConvertOptions(
+            column_types=dict(zip(names, types)),
+            true_values=['t'],
+            false_values=['f'],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False
+        )
+        try:
+            return pa_csv.read_csv(buffer, convert_options=convert_options).to_pandas()
+        except pa.ArrowInvalid as e:
+            logger.warning(f"Falling back to row-wise fetch, COPY output could not be parsed: {e}")
+            return self.execute_query(query)
+    
+    def execute_prepared(self, name, query, params=()):
+        """Execute a fixed query as a server-side prepared statement and return results as DataFrame
+        
+        The statement is PREPAREd once per pooled connection and EXECUTEd afterwards, so Postgres
+        skips parsing and planning on repeat calls. Positional parameters are written as $1, $2, ...
+        """
+        try:
+            with self.read_engine.connect() as sa_connection:
+                connection = sa_connection.connection
+                cursor = connection.cursor()
+                # info lives as long as the DBAPI connection, so it tracks what that session has prepared
+                if name not in connection.info.setdefault('prepared_statements', set()):
+                    cursor.execute(f"PREPARE {name} AS {query.strip().rstrip(';')}")
+                    connection.info['prepared_statements'].add(name)
+                
+                if params:
+                    cursor.execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", tuple(params))
+                else:
+                    cursor.execute(f"EXECUTE {name}")
+                columns = [column[0] for column in cursor.description]
+                return pd.DataFrame(cursor.fetchall(), columns=columns)
+        except Exception as e:
+            logger.error(f"Failed to execute prepared query {name}: {e}")
+            raise
     
     def get_schema_info(self):
         """Get database schema information for AI query generation"""
-        schema_info = {
-            'campaigns': {
-                'table': 'campaigns',
-                'columns': [
-                    'id', 'account_id', 'name', 'status', 'objective',
-                    'created_time', 'updated_time', 'start_time', 'stop_time',
-                    'budget_remaining', 'daily_budget', 'lifetime_budget'
-                ],
-                'description': 'Facebook advertising campaigns data with campaign details'
-            },
-            'adsets': {
-                'table': 'adsets', 
-                'columns': [
-                    'id', 'account_id', 'campaign_id', 'name', 'status',
-                    'optimization_goal', 'billing_event', 'bid_amount',
-                    'daily_budget', 'lifetime_budget', 'start_time', 'end_time'
-                ],
-                'description': 'Facebook ad sets data linked to campaigns'
-            },
-            'ads': {
-                'table': 'ads',
-                'columns': [
-                    'id', 'account_id', 'campaign_id', 'adset_id', 'name',
-                    'status', 'created_time', 'updated_time'
-                ],
-                'description': 'Individual Facebook ads linked to campaigns and adsets'
-            },
-            'insights': {
-                'table': 'insights',
-                'columns': [
-                    'id', 'account_id', 'date_start', 'date_stop', 
-                    'impressions', 'clicks', 'spend', 'reach', 'frequency', 
-                    'cpm', 'cpc', 'ctr', 'cpp'
-                ],
-                'description': 'Account-level performance metrics by date. NOTE: campaign_id, adset_id, ad_id are mostly NULL - this contains account-level aggregated data'
-            }
-        }
-        return schema_info
+        return SCHEMA_INFO
+    
+    def get_schema_prompt(self):
+        """Get the schema information formatted for the AI prompt"""
+        return get_schema_prompt()
     
     def close(self):
         """Close database connection"""
         try:
-            self.session.close()
             self.engine.dispose()
         except Exception as e:
             logger.error(f"Error closing database connection: {e}")
+
+_db_manager = None
+_db_manager_lock = threading.Lock()
+
+def get_db() -> DatabaseManager:
+    """Return the process-wide DatabaseManager, creating it (and its tables) on first use"""
+    global _db_manager
+    if _db_manager is None:
+        with _db_manager_lock:
+            if _db_manager is None:
+                _db_manager = DatabaseManager()
+    return _db_manager
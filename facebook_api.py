@@ -2,42 +2,225 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 import os
-import requests
+import re
+import threading
 import time
+import orjson
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs, urlencode
 import logging
-from typing import List, Dict, Any
+from types import MappingProxyType
+from typing import List, Dict, Any, Iterator, Mapping
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The Graph batch endpoint accepts at most this many sub-requests per call
+MAX_BATCH_SIZE = 50
+
+# Extra params per edge; object edges report their total row count so pagination can stop early
+EDGE_DEFAULT_PARAMS = {
+    'campaigns': {'summary': 'total_count'},
+    'adsets': {'summary': 'total_count'},
+    'ads': {'summary': 'total_count'}
+}
+
+# last_Nd insights presets longer than this many days are split into windows fetched concurrently
+INSIGHTS_WINDOW_DAYS = 5
+INSIGHTS_MAX_WORKERS = 6
+LAST_N_DAYS_RE = re.compile(r'last_(\d+)d')
+
+# Column layout and dtypes of each edge's frame, shared by every page and every fetch of that edge
+EDGE_SCHEMAS = {
+    'campaigns': {
+        'columns': [
+            'id', 'account_id', 'name', 'status', 'objective', 'created_time', 'updated_time',
+            'start_time', 'stop_time', 'budget_remaining', 'daily_budget', 'lifetime_budget'
+        ],
+        'datetime_columns': ['created_time', 'updated_time', 'start_time', 'stop_time'],
+        'float_columns': ['budget_remaining', 'daily_budget', 'lifetime_budget']
+    },
+    'adsets': {
+        'columns': [
+            'id', 'account_id', 'campaign_id', 'name', 'status', 'optimization_goal',
+            'billing_event', 'bid_amount', 'daily_budget', 'lifetime_budget',
+            'start_time', 'end_time', 'created_time', 'updated_time'
+        ],
+        'datetime_columns': ['start_time', 'end_time', 'created_time', 'updated_time'],
+        'float_columns': ['bid_amount', 'daily_budget', 'lifetime_budget']
+    },
+    'ads': {
+        'columns': [
+            'id', 'account_id', 'campaign_id', 'adset_id', 'name', 'status',
+            'created_time', 'updated_time'
+        ],
+        'datetime_columns': ['created_time', 'updated_time']
+    },
+    'insights': {
+        # ISO dates are kept as strings and parsed column-wise by the caller
+        'columns': [
+            'id', 'account_id', 'campaign_id', 'adset_id', 'ad_id', 'date_start', 'date_stop',
+            'impressions', 'clicks', 'spend', 'reach', 'frequency', 'cpm', 'cpc', 'ctr', 'cpp',
+            'actions', 'cost_per_action_type'
+        ],
+        'float_columns': ['spend', 'frequency', 'cpm', 'cpc', 'ctr', 'cpp'],
+        'int_columns': ['impressions', 'clicks', 'reach']
+    }
+}
+
+# An insights row is identified by the account, objects and day it reports on; its id is derived from these
+INSIGHT_KEY_COLUMNS = ['account_id', 'campaign_id', 'adset_id', 'ad_id', 'date_start']
+
+# Seconds a cached Graph response is served without revalidation, by the endpoint's edge name
+RESPONSE_CACHE_TTLS = {
+    'campaigns': 60,
+    'adsets': 60,
+    'ads': 60,
+    'insights': 300
+}
+
+# Bounds on the response cache: stale entries are kept this long for ETag revalidation, and cursor- and
+# date-keyed pages beyond the entry cap are evicted least recently used first
+RESPONSE_CACHE_MAX_AGE = 3600
+RESPONSE_CACHE_MAX_ENTRIES = 256
+
 class FacebookAPI:
-    def __init__(self):
-        """Initialize Facebook Marketing API client"""
+    # Graph fields requested per edge; callers pass their own list to fetch only what they consume
+    FIELD_PRESETS = {
+        'campaigns': [
+            'id', 'name', 'status', 'objective', 'created_time', 'updated_time',
+            'start_time', 'stop_time', 'budget_remaining', 'daily_budget', 'lifetime_budget'
+        ],
+        'adsets': [
+            'id', 'name', 'status', 'campaign_id', 'optimization_goal',
+            'billing_event', 'bid_amount', 'daily_budget', 'lifetime_budget',
+            'start_time', 'end_time', 'created_time', 'updated_time'
+        ],
+        'ads': [
+            'id', 'name', 'status', 'campaign_id', 'adset_id', 'created_time', 'updated_time'
+        ],
+        # Enough for the dashboard totals and daily trend
+        'insights_minimal': ['impressions', 'clicks', 'spend', 'campaign_id', 'date_start'],
+        # Every column the database and the AI queries read
+        'insights': [
+            'impressions', 'clicks', 'spend', 'reach', 'frequency', 'cpm', 'cpc', 'ctr', 'cpp',
+            'campaign_id', 'adset_id', 'ad_id', 'date_start', 'date_stop'
+        ],
+        # Adds the nested per-action arrays, which nothing in the app reads yet
+        'insights_full': [
+            'impressions', 'clicks', 'spend', 'reach', 'frequency',
+            'cpm', 'cpc', 'ctr', 'cpp', 'actions', 'cost_per_action_type',
+            'campaign_id', 'adset_id', 'ad_id', 'date_start', 'date_stop'
+        ]
+    }
+    
+    def __init__(self, keep_raw: bool = False):
+        """Initialize Facebook Marketing API client
+        
+        keep_raw attaches each record's raw API payload as a 'data' column; off by default since the
+        flattened columns hold every field the app reads and the payload doubles a batch's memory.
+        """
+        self.keep_raw = keep_raw
         self.access_token = os.getenv('FACEBOOK_ACCESS_TOKEN', '')
+        # Sample data hides real API failures, so it is only substituted when explicitly enabled for development
+        self.use_sample_on_error = os.getenv('FACEBOOK_USE_SAMPLE_ON_ERROR') == '1'
         self.api_version = 'v18.0'
         self.base_url = f'https://graph.facebook.com/{self.api_version}'
         self.limit = 500  # Pagination limit
         
+        # Keep-alive session so paginated calls reuse pooled connections instead of a new TLS handshake per page
+        self.session = requests.Session()
+        self.session.params = {
+            'access_token': self.access_token,
+            'limit': self.limit
+        }
+        # Advertise every codec urllib3 can decode here (br/zstd when their packages are installed), not just gzip
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        retries = Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+        self.session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retries))
+        
+        # (access_token, endpoint, params) -> (fetched_at, etag, body), in LRU order; the token in the key
+        # drops entries on rotation
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        self._preset_params = {
+            edge: MappingProxyType({'fields': ','.join(fields), **EDGE_DEFAULT_PARAMS.get(edge, {})})
+            for edge, fields in self.FIELD_PRESETS.items()
+        }
+        
         if not self.access_token:
             logger.warning("Facebook access token not found in environment variables")
     
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        """Close the pooled HTTP session"""
+        self.session.close()
+    
+    def _cache_get(self, cache_key: tuple):
+        """Return the cached (fetched_at, etag, body) for a request, or None if missing or too old to revalidate"""
+        with self._cache_lock:
+            entry = self._cache.get(cache_key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > RESPONSE_CACHE_MAX_AGE:
+                del self._cache[cache_key]
+                return None
+            self._cache.move_to_end(cache_key)
+            return entry
+    
+    def _cache_set(self, cache_key: tuple, entry: tuple):
+        """Store a response, dropping expired entries at the LRU end and any beyond the size cap"""
+        with self._cache_lock:
+            self._cache[cache_key] = entry
+            self._cache.move_to_end(cache_key)
+            now = time.time()
+            while self._cache and (
+                len(self._cache) > RESPONSE_CACHE_MAX_ENTRIES
+                or now - next(iter(self._cache.values()))[0] > RESPONSE_CACHE_MAX_AGE
+            ):
+                self._cache.popitem(last=False)
+    
     def _make_request(self, endpoint: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """Make API request to Facebook Marketing API"""
         url = f"{self.base_url}/{endpoint}"
+        cache_key = (self.access_token, endpoint, tuple(sorted((params or {}).items())))
+        ttl = RESPONSE_CACHE_TTLS.get(endpoint.rsplit('/', 1)[-1], 60)
         
-        default_params = {
-            'access_token': self.access_token,
-            'limit': self.limit
-        }
+        cached = self._cache_get(cache_key)
+        if cached and time.time() - cached[0] < ttl:
+            return cached[2]
         
-        if params:
-            default_params.update(params)
+        # Revalidate a stale entry with its ETag so an unchanged resource costs a 304, not a full payload
+        headers = {'If-None-Match': cached[1]} if cached and cached[1] else None
         
         try:
-            response = requests.get(url, params=default_params)
-            response.raise_for_status()
-            return response.json()
+            # access_token and limit come from the session's default params
+            response = self.session.get(url, params=params, headers=headers, timeout=(5, 30))
+            etag = response.headers.get('ETag')
+            if response.status_code == 304 and cached:
+                body = cached[2]
+                # A 304 doesn't always repeat the ETag; keep the one the body was fetched with
+                etag = etag or cached[1]
+            else:
+                response.raise_for_status()
+                body = orjson.loads(response.content)
+            
+            self._cache_set(cache_key, (time.time(), etag, body))
+            return body
             
         except requests.exceptions.RequestException as e:
             logger.error(f"API request failed: {e}")
@@ -45,266 +228,295 @@ class FacebookAPI:
                 logger.error(f"Response content: {e.response.text}")
             raise
     
-    def _paginate_request(self, endpoint: str, params: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-        """Handle paginated API requests"""
-        all_data = []
-        
+    def _edge_params(self, edge: str, fields: List[str] = None, **extra) -> Mapping[str, Any]:
+        """Query params for an account edge; fetch_all builds the same params so batched pages hit the cache"""
+        if fields:
+            return {'fields': ','.join(fields), **EDGE_DEFAULT_PARAMS.get(edge, {}), **extra}
+        # Preset field strings are joined once per client rather than on every fetch
+        return {**self._preset_params[edge], **extra} if extra else self._preset_params[edge]
+    
+    def _batch_request(self, requests_: List[tuple]) -> List[Any]:
+        """Run (endpoint, params) GETs in Graph batch calls; returns each decoded body, or None where it failed"""
+        bodies = []
+        for start in range(0, len(requests_), MAX_BATCH_SIZE):
+            chunk = requests_[start:start + MAX_BATCH_SIZE]
+            # Sub-requests inherit the access token from the batch call, but not the session's default limit
+            batch = [
+                {'method': 'GET', 'relative_url': f"{endpoint}?{urlencode({**params, 'limit': self.limit})}"}
+                for endpoint, params in chunk
+            ]
+            response = self.session.post(
+                f"{self.base_url}/",
+                data={'batch': orjson.dumps(batch).decode(), 'include_headers': 'false'},
+                timeout=(5, 60)
+            )
+            response.raise_for_status()
+            
+            for (endpoint, _), result in zip(chunk, orjson.loads(response.content)):
+                if result and result.get('code') == 200:
+                    bodies.append(orjson.loads(result['body']))
+                else:
+                    logger.warning(f"Batched request for {endpoint} failed: {result and result.get('body')}")
+                    bodies.append(None)
+        return bodies
+    
+    def _prime_cache(self, requests_: List[tuple]):
+        """Fetch the first page of several requests in one round trip and seed the response cache with them"""
         try:
-            response = self._make_request(endpoint, params)
+            bodies = self._batch_request(requests_)
+        except requests.exceptions.RequestException as e:
+            # Each fetch still issues its own GET on a cache miss
+            logger.warning(f"Batch request failed, fetching individually: {e}")
+            return
+        
+        now = time.time()
+        for (endpoint, params), body in zip(requests_, bodies):
+            if body is not None:
+                self._cache_set((self.access_token, endpoint, tuple(sorted(params.items()))), (now, None, body))
+    
+    def _iter_pages(self, endpoint: str, params: Dict[str, Any] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the records of each page of a paginated API request as it arrives"""
+        response = self._make_request(endpoint, params)
+        # Present when the request asked for summary=total_count
+        total = response.get('summary', {}).get('total_count')
+        fetched = 0
+        
+        # Yield data from first page
+        if 'data' in response:
+            fetched += len(response['data'])
+            yield response['data']
+        
+        # Handle pagination; skip the trailing request once every counted record has arrived
+        while 'paging' in response and 'next' in response['paging'] and (total is None or fetched < total):
+            logger.info(f"Fetching next page of {endpoint}")
             
-            # Add data from first page
-            if 'data' in response:
-                all_data.extend(response['data'])
+            # Prefer the decoded cursor from the response; fall back to the next URL's query string
+            after_param = response['paging'].get('cursors', {}).get('after')
+            if not after_param:
+                query = parse_qs(urlsplit(response['paging']['next']).query)
+                after_param = query.get('after', [None])[0]
             
-            # Handle pagination
-            while 'paging' in response and 'next' in response['paging']:
-                logger.info(f"Fetching next page, current count: {len(all_data)}")
-                
-                # Extract after parameter from next URL
-                next_url = response['paging']['next']
-                after_param = next_url.split('after=')[1].split('&')[0] if 'after=' in next_url else None
+            if after_param:
+                # A fresh dict per page leaves the caller's (possibly shared, read-only) params untouched
+                response = self._make_request(endpoint, {**(params or {}), 'after': after_param})
                 
-                if after_param:
-                    paginated_params = params.copy() if params else {}
-                    paginated_params['after'] = after_param
-                    response = self._make_request(endpoint, paginated_params)
-                    
-                    if 'data' in response:
-                        all_data.extend(response['data'])
-                    else:
-                        break
+                if 'data' in response:
+                    fetched += len(response['data'])
+                    yield response['data']
                 else:
                     break
-                
-                # Rate limiting
-                time.sleep(0.1)
-            
-            logger.info(f"Fetched total {len(all_data)} records from {endpoint}")
-            return all_data
+            else:
+                break
+    
+    def _paginate_frame(self, endpoint: str, params: Dict[str, Any], account_id: str, **frame_options) -> pd.DataFrame:
+        """Fetch a paginated edge into one typed DataFrame, converting each page as it arrives
+        
+        Only one page of raw record dicts is alive at a time; the columnar frames hold the rest.
+        """
+        try:
+            frames = [
+                self._records_frame(page, account_id, **frame_options)
+                for page in self._iter_pages(endpoint, params) if page
+            ]
+            logger.info(f"Fetched total {sum(len(frame) for frame in frames)} records from {endpoint}")
+            if not frames:
+                return self._records_frame([], account_id, **frame_options)
+            return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
             
         except Exception as e:
             logger.error(f"Error in paginated request for {endpoint}: {e}")
             raise
     
-    def fetch_campaigns(self, account_id: str) -> List[Dict[str, Any]]:
+    def fetch_campaigns(self, account_id: str, fields: List[str] = None) -> pd.DataFrame:
         """Fetch campaigns for the given account"""
         endpoint = f"{account_id}/campaigns"
-        
-        fields = [
-            'id', 'name', 'status', 'objective', 'created_time', 'updated_time',
-            'start_time', 'stop_time', 'budget_remaining', 'daily_budget',
-            'lifetime_budget', 'account_id'
-        ]
-        
-        params = {
-            'fields': ','.join(fields)
-        }
+        params = self._edge_params('campaigns', fields)
+        fields = fields or self.FIELD_PRESETS['campaigns']
         
         try:
-            campaigns = self._paginate_request(endpoint, params)
-            
-            # Process and clean data
-            processed_campaigns = []
-            for campaign in campaigns:
-                processed_campaign = {
-                    'id': campaign.get('id'),
-                    'account_id': account_id,
-                    'name': campaign.get('name'),
-                    'status': campaign.get('status'),
-                    'objective': campaign.get('objective'),
-                    'created_time': self._parse_datetime(campaign.get('created_time')),
-                    'updated_time': self._parse_datetime(campaign.get('updated_time')),
-                    'start_time': self._parse_datetime(campaign.get('start_time')),
-                    'stop_time': self._parse_datetime(campaign.get('stop_time')),
-                    'budget_remaining': self._parse_float(campaign.get('budget_remaining')),
-                    'daily_budget': self._parse_float(campaign.get('daily_budget')),
-                    'lifetime_budget': self._parse_float(campaign.get('lifetime_budget')),
-                    'data': campaign  # Store raw data
-                }
-                processed_campaigns.append(processed_campaign)
-            
-            return processed_campaigns
+            return self._paginate_frame(endpoint, params, account_id, fields=fields, **EDGE_SCHEMAS['campaigns'])
             
         except Exception as e:
             logger.error(f"Error fetching campaigns: {e}")
+            if not self.use_sample_on_error:
+                raise
             # Return sample data for development/testing
-            return self._get_sample_campaigns(account_id)
+            return pd.DataFrame(self._get_sample_campaigns(account_id))
     
-    def fetch_adsets(self, account_id: str) -> List[Dict[str, Any]]:
+    def fetch_adsets(self, account_id: str, fields: List[str] = None) -> pd.DataFrame:
         """Fetch ad sets for the given account"""
         endpoint = f"{account_id}/adsets"
-        
-        fields = [
-            'id', 'name', 'status', 'campaign_id', 'optimization_goal',
-            'billing_event', 'bid_amount', 'daily_budget', 'lifetime_budget',
-            'start_time', 'end_time', 'created_time', 'updated_time', 'account_id'
-        ]
-        
-        params = {
-            'fields': ','.join(fields)
-        }
+        params = self._edge_params('adsets', fields)
+        fields = fields or self.FIELD_PRESETS['adsets']
         
         try:
-            adsets = self._paginate_request(endpoint, params)
-            
-            # Process and clean data
-            processed_adsets = []
-            for adset in adsets:
-                processed_adset = {
-                    'id': adset.get('id'),
-                    'account_id': account_id,
-                    'campaign_id': adset.get('campaign_id'),
-                    'name': adset.get('name'),
-                    'status': adset.get('status'),
-                    'optimization_goal': adset.get('optimization_goal'),
-                    'billing_event': adset.get('billing_event'),
-                    'bid_amount': self._parse_float(adset.get('bid_amount')),
-                    'daily_budget': self._parse_float(adset.get('daily_budget')),
-                    'lifetime_budget': self._parse_float(adset.get('lifetime_budget')),
-                    'start_time': self._parse_datetime(adset.get('start_time')),
-                    'end_time': self._parse_datetime(adset.get('end_time')),
-                    'created_time': self._parse_datetime(adset.get('created_time')),
-                    'updated_time': self._parse_datetime(adset.get('updated_time')),
-                    'data': adset  # Store raw data
-                }
-                processed_adsets.append(processed_adset)
-            
-            return processed_adsets
+            return self._paginate_frame(endpoint, params, account_id, fields=fields, **EDGE_SCHEMAS['adsets'])
             
         except Exception as e:
             logger.error(f"Error fetching ad sets: {e}")
+            if not self.use_sample_on_error:
+                raise
             # Return sample data for development/testing
-            return self._get_sample_adsets(account_id)
+            return pd.DataFrame(self._get_sample_adsets(account_id))
     
-    def fetch_ads(self, account_id: str) -> List[Dict[str, Any]]:
+    def fetch_ads(self, account_id: str, fields: List[str] = None) -> pd.DataFrame:
         """Fetch ads for the given account"""
         endpoint = f"{account_id}/ads"
-        
-        fields = [
-            'id', 'name', 'status', 'campaign_id', 'adset_id',
-            'created_time', 'updated_time', 'account_id'
-        ]
-        
-        params = {
-            'fields': ','.join(fields)
-        }
+        params = self._edge_params('ads', fields)
+        fields = fields or self.FIELD_PRESETS['ads']
         
         try:
-            ads = self._paginate_request(endpoint, params)
-            
-            # Process and clean data
-            processed_ads = []
-            for ad in ads:
-                processed_ad = {
-                    'id': ad.get('id'),
-                    'account_id': account_id,
-                    'campaign_id': ad.get('campaign_id'),
-                    'adset_id': ad.get('adset_id'),
-                    'name': ad.get('name'),
-                    'status': ad.get('status'),
-                    'created_time': self._parse_datetime(ad.get('created_time')),
-                    'updated_time': self._parse_datetime(ad.get('updated_time')),
-                    'data': ad  # Store raw data
-                }
-                processed_ads.append(processed_ad)
-            
-            return processed_ads
+            return self._paginate_frame(endpoint, params, account_id, fields=fields, **EDGE_SCHEMAS['ads'])
             
         except Exception as e:
             logger.error(f"Error fetching ads: {e}")
+            if not self.use_sample_on_error:
+                raise
             # Return sample data for development/testing
-            return self._get_sample_ads(account_id)
+            return pd.DataFrame(self._get_sample_ads(account_id))
     
-    def fetch_insights(self, account_id: str, date_preset: str = 'last_30d') -> List[Dict[str, Any]]:
-        """Fetch insights for the given account"""
+    def _insights_requests(self, account_id: str, date_preset: str, fields: List[str] = None,
+                           window_days: int = INSIGHTS_WINDOW_DAYS) -> List[tuple]:
+        """(endpoint, params) per date window of an insights fetch; presets that can't be split stay one request"""
         endpoint = f"{account_id}/insights"
+        match = LAST_N_DAYS_RE.fullmatch(date_preset)
+        days = int(match.group(1)) if match else 0
+        if days <= window_days:
+            return [(endpoint, self._edge_params('insights', fields, date_preset=date_preset, time_increment=1))]
         
-        fields = [
-            'impressions', 'clicks', 'spend', 'reach', 'frequency',
-            'cpm', 'cpc', 'ctr', 'cpp', 'actions', 'cost_per_action_type',
-            'campaign_id', 'adset_id', 'ad_id', 'date_start', 'date_stop'
-        ]
+        # last_Nd covers the N days before today
+        today = datetime.now().date()
+        windows = []
+        for start in range(days, 0, -window_days):
+            time_range = orjson.dumps({
+                'since': (today - timedelta(days=start)).isoformat(),
+                'until': (today - timedelta(days=max(start - window_days, 0) + 1)).isoformat()
+            }).decode()
+            windows.append((endpoint, self._edge_params('insights', fields, time_range=time_range, time_increment=1)))
+        return windows
+    
+    def _iter_insight_frames(self, endpoint: str, params: Dict[str, Any], account_id: str,
+                             fields: List[str] = None) -> Iterator[pd.DataFrame]:
+        """Yield processed insights one API page at a time, without the sample-data fallback"""
+        fields = fields or self.FIELD_PRESETS['insights']
+        count = 0
+        for page in self._iter_pages(endpoint, params):
+            processed_insights = self._process_insights(account_id, page, fields)
+            count += len(processed_insights)
+            yield processed_insights
         
-        params = {
-            'fields': ','.join(fields),
-            'date_preset': date_preset,
-            'time_increment': 1
-        }
+        logger.info(f"Fetched total {count} records from {endpoint}")
+    
+    def iter_insights(self, account_id: str, date_preset: str = 'last_30d',
+                      fields: List[str] = None) -> Iterator[pd.DataFrame]:
+        """Yield processed insights for the given account one API page at a time"""
+        endpoint = f"{account_id}/insights"
+        params = self._edge_params('insights', fields, date_preset=date_preset, time_increment=1)
         
+        count = 0
         try:
-            insights = self._paginate_request(endpoint, params)
-            
-            # Process and clean data
-            processed_insights = []
-            for insight in insights:
-                processed_insight = {
-                    'id': f"{insight.get('campaign_id', '')}-{insight.get('date_start', '')}-{len(processed_insights)}",
-                    'account_id': account_id,
-                    'campaign_id': insight.get('campaign_id'),
-                    'adset_id': insight.get('adset_id'),
-                    'ad_id': insight.get('ad_id'),
-                    'date_start': self._parse_date(insight.get('date_start')),
-                    'date_stop': self._parse_date(insight.get('date_stop')),
-                    'impressions': self._parse_int(insight.get('impressions')),
-                    'clicks': self._parse_int(insight.get('clicks')),
-                    'spend': self._parse_float(insight.get('spend')),
-                    'reach': self._parse_int(insight.get('reach')),
-                    'frequency': self._parse_float(insight.get('frequency')),
-                    'cpm': self._parse_float(insight.get('cpm')),
-                    'cpc': self._parse_float(insight.get('cpc')),
-                    'ctr': self._parse_float(insight.get('ctr')),
-                    'cpp': self._parse_float(insight.get('cpp')),
-                    'actions': insight.get('actions'),
-                    'cost_per_action_type': insight.get('cost_per_action_type'),
-                    'data': insight  # Store raw data
-                }
-                processed_insights.append(processed_insight)
-            
-            return processed_insights
+            for processed_insights in self._iter_insight_frames(endpoint, params, account_id, fields):
+                count += len(processed_insights)
+                yield processed_insights
             
         except Exception as e:
             logger.error(f"Error fetching insights: {e}")
+            if count or not self.use_sample_on_error:
+                raise
             # Return sample data for development/testing
-            return self._get_sample_insights(account_id)
+            yield self._get_sample_insights(account_id)
     
-    def _parse_datetime(self, date_string: str) -> datetime:
-        """Parse datetime string from Facebook API"""
-        if not date_string:
-            return None
+    def fetch_insights(self, account_id: str, date_preset: str = 'last_30d',
+                       fields: List[str] = None) -> pd.DataFrame:
+        """Fetch insights for the given account, fetching the date windows of long presets concurrently"""
+        windows = self._insights_requests(account_id, date_preset, fields)
+        if len(windows) == 1:
+            pages = list(self.iter_insights(account_id, date_preset, fields))
+            return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
+        
         try:
-            return datetime.strptime(date_string, '%Y-%m-%dT%H:%M:%S%z')
-        except:
-            try:
-                return datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S')
-            except:
-                return None
+            # Windows share the pooled session; each one paginates independently
+            with ThreadPoolExecutor(max_workers=min(len(windows), INSIGHTS_MAX_WORKERS)) as executor:
+                results = list(executor.map(
+                    lambda window: list(self._iter_insight_frames(*window, account_id, fields)), windows
+                ))
+        except Exception as e:
+            logger.error(f"Error fetching insights: {e}")
+            if not self.use_sample_on_error:
+                raise
+            # Return sample data for development/testing
+            return self._get_sample_insights(account_id)
+        
+        pages = [page for window_pages in results for page in window_pages]
+        return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
     
-    def _parse_date(self, date_string: str) -> datetime:
-        """Parse date string from Facebook API"""
-        if not date_string:
-            return None
-        try:
-            return datetime.strptime(date_string, '%Y-%m-%d')
-        except:
-            return None
+    def fetch_all(self, account_id: str, date_preset: str = 'last_30d',
+                  insights_fields: List[str] = None) -> Dict[str, pd.DataFrame]:
+        """Fetch campaigns, ad sets, ads and insights: first pages in one batch call, the rest concurrently"""
+        self._prime_cache([
+            (f"{account_id}/campaigns", self._edge_params('campaigns')),
+            (f"{account_id}/adsets", self._edge_params('adsets')),
+            (f"{account_id}/ads", self._edge_params('ads')),
+            *self._insights_requests(account_id, date_preset, insights_fields)
+        ])
+        
+        # First pages are now cache hits; only continuation pages go over the wire
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {
+                'campaigns': executor.submit(self.fetch_campaigns, account_id),
+                'adsets': executor.submit(self.fetch_adsets, account_id),
+                'ads': executor.submit(self.fetch_ads, account_id),
+                'insights': executor.submit(self.fetch_insights, account_id, date_preset, insights_fields)
+            }
+            return {name: future.result() for name, future in futures.items()}
     
-    def _parse_float(self, value) -> float:
-        """Parse float value"""
-        if value is None or value == '':
-            return 0.0
-        try:
-            return float(value)
-        except:
-            return 0.0
+    def _process_insights(self, account_id: str, insights: List[Dict[str, Any]],
+                          fields: List[str] = None) -> pd.DataFrame:
+        """Process and clean one page of insights"""
+        df = self._records_frame(
+            insights, account_id, fields=fields or self.FIELD_PRESETS['insights'], **EDGE_SCHEMAS['insights']
+        )
+        df['id'] = self._insight_ids(df)
+        return df
     
-    def _parse_int(self, value) -> int:
-        """Parse integer value"""
-        if value is None or value == '':
-            return 0
-        try:
-            return int(value)
-        except:
-            return 0
+    @staticmethod
+    def _insight_ids(df: pd.DataFrame) -> pd.Series:
+        """Row ids hashed from INSIGHT_KEY_COLUMNS, so a re-fetch of the same row upserts onto it
+        
+        Ids don't depend on row order or page position; account-level rows (no object ids) stay
+        distinct per account. The 64-bit hash is read as a signed integer to fit the BIGINT id column,
+        and handled as text like every other object id.
+        """
+        key = df.reindex(columns=INSIGHT_KEY_COLUMNS)
+        if pd.api.types.is_datetime64_any_dtype(key['date_start']):
+            key['date_start'] = key['date_start'].dt.strftime('%Y-%m-%d')
+        key = key.fillna('').astype(str)
+        hashes = pd.util.hash_pandas_object(key, index=False).to_numpy().view(np.int64)
+        return pd.Series(hashes, index=df.index).astype(str)
+    
+    def _records_frame(self, records: List[Dict[str, Any]], account_id: str, columns: List[str],
+                       datetime_columns: List[str] = (), float_columns: List[str] = (),
+                       int_columns: List[str] = (), fields: List[str] = None) -> pd.DataFrame:
+        """Build a typed DataFrame from raw API records, coercing whole columns instead of parsing per field
+        
+        When fields is given, only those columns (plus id and account_id) are kept.
+        """
+        if fields is not None:
+            wanted = set(fields) | {'id', 'account_id'}
+            columns = [col for col in columns if col in wanted]
+        df = pd.DataFrame.from_records(records, columns=columns)
+        df['account_id'] = account_id
+        
+        for col in df.columns.intersection(float_columns):
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+        for col in df.columns.intersection(int_columns):
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('int64')
+        for col in df.columns.intersection(datetime_columns):
+            df[col] = pd.to_datetime(df[col], format='ISO8601', utc=True, errors='coerce')
+        
+        if self.keep_raw:
+            df['data'] = records  # Store raw data
+        return df
     
     # Sample data methods for development/testing when API fails
     def _get_sample_campaigns(self, account_id: str) -> List[Dict[str, Any]]:
@@ -312,7 +524,7 @@ class FacebookAPI:
         logger.info("Returning sample campaign data for development")
         return [
             {
-                'id': 'camp_001',
+                'id': '120200000000001',
                 'account_id': account_id,
                 'name': 'Holiday Sales Campaign',
                 'status': 'ACTIVE',
@@ -327,7 +539,7 @@ class FacebookAPI:
                 'data': {}
             },
             {
-                'id': 'camp_002',
+                'id': '120200000000002',
                 'account_id': account_id,
                 'name': 'Brand Awareness Campaign',
                 'status': 'ACTIVE',
@@ -348,9 +560,9 @@ class FacebookAPI:
         logger.info("Returning sample adset data for development")
         return [
             {
-                'id': 'adset_001',
+                'id': '120210000000001',
                 'account_id': account_id,
-                'campaign_id': 'camp_001',
+                'campaign_id': '120200000000001',
                 'name': 'Holiday Sales - Desktop',
                 'status': 'ACTIVE',
                 'optimization_goal': 'CONVERSIONS',
@@ -365,9 +577,9 @@ class FacebookAPI:
                 'data': {}
             },
             {
-                'id': 'adset_002',
+                'id': '120210000000002',
                 'account_id': account_id,
-                'campaign_id': 'camp_001',
+                'campaign_id': '120200000000001',
                 'name': 'Holiday Sales - Mobile',
                 'status': 'ACTIVE',
                 'optimization_goal': 'CONVERSIONS',
@@ -388,10 +600,10 @@ class FacebookAPI:
         logger.info("Returning sample ads data for development")
         return [
             {
-                'id': 'ad_001',
+                'id': '120220000000001',
                 'account_id': account_id,
-                'campaign_id': 'camp_001',
-                'adset_id': 'adset_001',
+                'campaign_id': '120200000000001',
+                'adset_id': '120210000000001',
                 'name': 'Holiday Sale - Desktop Video',
                 'status': 'ACTIVE',
                 'created_time': datetime.now() - timedelta(days=30),
@@ -399,10 +611,10 @@ class FacebookAPI:
                 'data': {}
             },
             {
-                'id': 'ad_002',
+                'id': '120220000000002',
                 'account_id': account_id,
-                'campaign_id': 'camp_001',
-                'adset_id': 'adset_002',
+                'campaign_id': '120200000000001',
+                'adset_id': '120210000000002',
                 'name': 'Holiday Sale - Mobile Image',
                 'status': 'ACTIVE',
                 'created_time': datetime.now() - timedelta(days=30),
@@ -411,58 +623,35 @@ class FacebookAPI:
             }
         ]
     
-    def _get_sample_insights(self, account_id: str) -> List[Dict[str, Any]]:
-        """Return sample insights data for development"""
+    def _get_sample_insights(self, account_id: str, days: int = 30) -> pd.DataFrame:
+        """Return sample insights data for development, one row per sample campaign per day"""
         logger.info("Returning sample insights data for development")
-        insights = []
+        i = np.arange(days)
+        dates = pd.Timestamp.now().normalize() - pd.to_timedelta(i, unit='D')
         
-        # Generate 30 days of sample data
-        for i in range(30):
-            date = datetime.now() - timedelta(days=i)
-            
-            insights.extend([
-                {
-                    'id': f"insight_{i}_1",
-                    'account_id': account_id,
-                    'campaign_id': 'camp_001',
-                    'adset_id': 'adset_001',
-                    'ad_id': 'ad_001',
-                    'date_start': date,
-                    'date_stop': date,
-                    'impressions': 1000 + (i * 50),
-                    'clicks': 50 + (i * 2),
-                    'spend': 45.50 + (i * 1.5),
-                    'reach': 800 + (i * 30),
-                    'frequency': 1.2 + (i * 0.01),
-                    'cpm': 45.50,
-                    'cpc': 0.91,
-                    'ctr': 5.0,
-                    'cpp': 0.057,
-                    'actions': [],
-                    'cost_per_action_type': [],
-                    'data': {}
-                },
-                {
-                    'id': f"insight_{i}_2",
-                    'account_id': account_id,
-                    'campaign_id': 'camp_002',
-                    'adset_id': 'adset_002',
-                    'ad_id': 'ad_002',
-                    'date_start': date,
-                    'date_stop': date,
-                    'impressions': 800 + (i * 40),
-                    'clicks': 40 + (i * 1.5),
-                    'spend': 35.75 + (i * 1.2),
-                    'reach': 650 + (i * 25),
-                    'frequency': 1.1 + (i * 0.008),
-                    'cpm': 44.69,
-                    'cpc': 0.89,
-                    'ctr': 5.2,
-                    'cpp': 0.055,
-                    'actions': [],
-                    'cost_per_action_type': [],
-                    'data': {}
-                }
-            ])
+        # Per-campaign (id number, base metrics, daily step); each frame is built column-wise
+        campaigns = [
+            (1, dict(impressions=(1000, 50), clicks=(50, 2), spend=(45.50, 1.5), reach=(800, 30),
+                     frequency=(1.2, 0.01)), dict(cpm=45.50, cpc=0.91, ctr=5.0, cpp=0.057)),
+            (2, dict(impressions=(800, 40), clicks=(40, 1.5), spend=(35.75, 1.2), reach=(650, 25),
+                     frequency=(1.1, 0.008)), dict(cpm=44.69, cpc=0.89, ctr=5.2, cpp=0.055))
+        ]
+        frames = []
+        for number, trends, rates in campaigns:
+            frame = pd.DataFrame({
+                'account_id': account_id,
+                'campaign_id': f'12020000000000{number}',
+                'adset_id': f'12021000000000{number}',
+                'ad_id': f'12022000000000{number}',
+                'date_start': dates,
+                'date_stop': dates,
+                **{col: base + i * step for col, (base, step) in trends.items()},
+                **rates
+            })
+            frames.append(frame)
         
+        insights = pd.concat(frames, ignore_index=True)
+        insights.insert(0, 'id', self._insight_ids(insights))
+        # Integer metrics must stay integral for the database's integer columns
+        insights[['impressions', 'clicks', 'reach']] = insights[['impressions', 'clicks', 'reach']].astype('int64')
         return insights
@@ -3,14 +3,196 @@ from dotenv import load_dotenv
 load_dotenv()
 import os
 import google.generativeai as genai
+import numpy as np
 import pandas as pd
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Any, Iterator, Optional, Tuple
 import re
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Patterns used on every query and response, compiled once
+SQL_FENCE_RE = re.compile(r'```(?:sql)?\n?')
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Phrases that route a question to the analytical path instead of plain SQL generation
+ANALYTICAL_KEYWORDS = [
+    'roas', 'cac', 'cpr', 'ctr trend', 'vs', 'compared to', 'comparison',
+    'best performing', 'worst performing', 'burning budget', 'low performance',
+    'drops', 'spikes', 'anomalies', 'top creatives', 'learning phase',
+    'limited by budget', 'audience size', 'impact of changes', 'budget shifts',
+    'over-spending', 'under-spending', 'unexpected spike', 'same day last week',
+    'yesterday vs today', 'past 7 days', 'trend analysis', 'performance analysis'
+]
+# One alternation scans the query once instead of a substring search per keyword
+ANALYTICAL_RE = re.compile('|'.join(map(re.escape, ANALYTICAL_KEYWORDS)), re.IGNORECASE)
+
+# Bounds on the result sample sent to Gemini; wide or large results otherwise inflate prompt tokens
+SUMMARY_SAMPLE_COLUMNS = 6
+SUMMARY_MAX_CHARS = 2000
+
+# Prompt templates, filled with str.format; the SQL instructions and schema are bound once per engine
+# as the SQL model's system instruction, so each request only carries the user's question
+SQL_SYSTEM_PROMPT = """\
+You are a PostgreSQL expert. Convert natural language queries to SQL.
+
+Database Schema:
+{schema_context}
+
+Important Guidelines:
+- Return ONLY the SQL query, no explanations or markdown
+- insights table contains account-level data by date, NOT individual ad/campaign data
+- For ad/campaign specific queries, use the ads/campaigns/adsets tables directly
+- insights table is mainly useful for time-based analysis and account totals
+- Use appropriate aggregations (SUM, AVG, COUNT)
+- Limit results appropriately (5-20 rows for "top" queries)
+- Use clear column aliases
+
+Examples:
+"top 5 ads by name" → SELECT name FROM ads WHERE status = 'ACTIVE' ORDER BY name LIMIT 5;
+"top 5 campaigns by budget" → SELECT name, daily_budget FROM campaigns WHERE daily_budget > 0 ORDER BY daily_budget DESC LIMIT 5;
+"total spend by date" → SELECT date_start, spend FROM insights WHERE spend > 0 ORDER BY date_start;
+"campaign count" → SELECT COUNT(*) as campaign_count FROM campaigns;
+"""
+
+SQL_PROMPT = """\
+User Query: {user_query}
+
+SQL Query:
+"""
+
+INSIGHTS_PROMPT = """\
+Analyze the following data and provide insights based on the user's question.
+
+User Question: {user_query}
+SQL Query: {sql_query}
+Data Summary: {data_summary}
+
+Provide a concise analysis with:
+1. Key findings from the data
+2. Notable trends or patterns
+3. Actionable insights or recommendations
+
+Keep the response under 200 words and focus on business value.
+
+Analysis:
+"""
+
+ANALYTICAL_PROMPT = """\
+You are a Facebook Ads performance analyst. Analyze the provided data and answer the user's question with detailed insights, calculations, and recommendations.
+
+User Question: {user_query}
+
+Available Data Summary:
+{data_summary}
+
+Please provide:
+1. Direct answer to the user's question
+2. Relevant calculations (ROAS, CAC, CPR, CTR trends, etc.)
+3. Performance insights and patterns
+4. Actionable recommendations
+5. Any notable anomalies or concerns
+
+Format your response as a comprehensive analysis with clear sections and specific numbers where available.
+If the question asks for comparisons (vs yesterday, last week, etc.), calculate and present the differences.
+If the question asks about trends, analyze the progression over time.
+If the question asks about performance, identify best and worst performers with specific metrics.
+
+Make calculations based on the actual data provided. For metrics not directly available, explain what additional data would be needed.
+"""
+
+def column_means(values: np.ndarray) -> np.ndarray:
+    """NaN-skipping means of a 2-D array's columns; all-NaN columns give NaN without nanmean's RuntimeWarning"""
+    counts = np.count_nonzero(~np.isnan(values), axis=0)
+    with np.errstate(invalid='ignore'):
+        return np.nansum(values, axis=0) / counts
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache whose entries expire after a TTL"""
+    
+    def __init__(self, max_size: int = 256, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any):
+        """Store value under key, evicting the least recently used entries beyond max_size"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+class InFlightRequests:
+    """Lets concurrent callers with the same key share one in-progress call instead of each making it
+    
+    Followers wait at most wait_timeout seconds for the leader, then make the call themselves, so a
+    stalled or abandoned leader can't hang them.
+    """
+    
+    def __init__(self, wait_timeout: float = 30):
+        self.wait_timeout = wait_timeout
+        self._futures = {}
+        self._lock = threading.Lock()
+    
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """Return the future for key and whether this caller is the leader that must resolve and release it"""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                return future, False
+            future = self._futures[key] = Future()
+            return future, True
+    
+    def release(self, key: str):
+        """Forget key once its leader is done; later callers start a fresh call"""
+        with self._lock:
+            self._futures.pop(key, None)
+    
+    def run(self, key: str, call):
+        """Return call()'s result, sharing one invocation among concurrent callers with the same key"""
+        future, leader = self.claim(key)
+        if not leader:
+            try:
+                return future.result(timeout=self.wait_timeout)
+            except TimeoutError:
+                logger.warning(f"In-flight call for {key} still running after {self.wait_timeout}s, calling directly")
+                return call()
+        try:
+            result = call()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.release(key)
+
+# Gemini responses shared by every engine in the process; keys include the schema or data they were derived from
+response_cache = MemoryCache()
+# Identical prompts from concurrent sessions wait on one Gemini call instead of each sending their own
+in_flight = InFlightRequests()
+
 class GeminiQueryEngine:
     def __init__(self, database_manager):
         """Initialize Gemini query engine"""
@@ -24,13 +206,35 @@ class GeminiQueryEngine:
             self.model = genai.GenerativeModel('gemini-1.5-flash')
         
         self.schema_info = self.db_manager.get_schema_info()
+        # The schema is fixed for the engine's lifetime, so its prompt text and cache hash are built once
+        self.schema_context = self._create_schema_context()
+        self.schema_hash = hashlib.sha1(self.schema_context.encode()).hexdigest()
+        if self.api_key:
+            # The schema and guidelines go out as a system instruction rather than in every SQL prompt
+            self.sql_model = genai.GenerativeModel(
+                'gemini-1.5-flash',
+                system_instruction=SQL_SYSTEM_PROMPT.format(schema_context=self.schema_context)
+            )
+    
+    @staticmethod
+    def _normalize_query(user_query: str) -> str:
+        """Fold case, whitespace and trailing punctuation so trivially different phrasings share a cache entry"""
+        return WHITESPACE_RE.sub(' ', user_query.lower()).strip().rstrip('?.!').strip()
+    
+    @staticmethod
+    def _cache_key(*parts: str) -> str:
+        """Hash the parts a Gemini response depends on into a cache key"""
+        return hashlib.sha1('\x1f'.join(parts).encode()).hexdigest()
     
-    def process_query(self, user_query: str) -> Dict[str, Any]:
-        """Process natural language query and return results"""
+    def process_query(self, user_query: str, stream: bool = False) -> Dict[str, Any]:
+        """Process natural language query and return results
+        
+        With stream set, 'insights' is None and 'insights_stream' yields the AI text as Gemini produces it.
+        """
         try:
             # Check if this is an analytical query requiring calculations/insights
             if self._is_analytical_query(user_query):
-                return self._process_analytical_query(user_query)
+                return self._process_analytical_query(user_query, stream)
             
             # Generate SQL query using Gemini
             sql_query = self._generate_sql_query(user_query)
@@ -46,7 +250,24 @@ class GeminiQueryEngine:
             # Execute SQL query
             data = self._execute_sql_query(sql_query)
             
+            if data is None or data.empty:
+                # Nothing to analyze, so no prompt is built and Gemini is not called
+                return {
+                    'sql_query': sql_query,
+                    'data': data,
+                    'insights': 'No data found for the given query.',
+                    'error': None
+                }
+            
             # Generate insights
+            if stream:
+                return {
+                    'sql_query': sql_query,
+                    'data': data,
+                    'insights': None,
+                    'insights_stream': self._stream_insights(user_query, data, sql_query),
+                    'error': None
+                }
             insights = self._generate_insights(user_query, data, sql_query)
             
             return {
@@ -68,39 +289,20 @@ class GeminiQueryEngine:
     def _generate_sql_query(self, user_query: str) -> Optional[str]:
         """Generate SQL query from natural language using Gemini"""
         try:
-            # Create schema context
-            schema_context = self._create_schema_context()
-            
-            prompt = f"""
-            You are a PostgreSQL expert. Convert this natural language query to SQL.
-            
-            Database Schema:
-            {schema_context}
-            
-            User Query: {user_query}
-            
-            Important Guidelines:
-            - Return ONLY the SQL query, no explanations or markdown
-            - insights table contains account-level data by date, NOT individual ad/campaign data
-            - For ad/campaign specific queries, use the ads/campaigns/adsets tables directly
-            - insights table is mainly useful for time-based analysis and account totals
-            - Use appropriate aggregations (SUM, AVG, COUNT)
-            - Limit results appropriately (5-20 rows for "top" queries)
-            - Use clear column aliases
-            
-            Examples:
-            "top 5 ads by name" → SELECT name FROM ads WHERE status = 'ACTIVE' ORDER BY name LIMIT 5;
-            "top 5 campaigns by budget" → SELECT name, daily_budget FROM campaigns WHERE daily_budget > 0 ORDER BY daily_budget DESC LIMIT 5;
-            "total spend by date" → SELECT date_start, spend FROM insights WHERE spend > 0 ORDER BY date_start;
-            "campaign count" → SELECT COUNT(*) as campaign_count FROM campaigns;
-            
-            SQL Query:
-            """
+            prompt = SQL_PROMPT.format(user_query=user_query)
             
             if hasattr(self, 'model'):
-                response = self.model.generate_content(prompt)
-                sql_query = self._clean_sql_response(response.text)
+                cache_key = self._cache_key('sql', self._normalize_query(user_query), self.schema_hash)
+                sql_query = response_cache.get(cache_key)
+                if sql_query:
+                    logger.info(f"Reusing cached SQL: {sql_query}")
+                    return sql_query
+                
+                sql_query = in_flight.run(
+                    cache_key, lambda: self._clean_sql_response(self.sql_model.generate_content(prompt).text)
+                )
                 logger.info(f"Generated SQL: {sql_query}")
+                response_cache.set(cache_key, sql_query)
                 return sql_query
             else:
                 logger.error("Gemini model not available - API key required")
@@ -115,24 +317,18 @@ class GeminiQueryEngine:
                     simple_prompt = f"Convert to SQL: {user_query}\nUse these tables: campaigns, adsets, ads, insights"
                     response = self.model.generate_content(simple_prompt)
                     return self._clean_sql_response(response.text)
-                except:
-                    pass
+                except Exception as retry_error:
+                    logger.error(f"Retry with simpler prompt failed: {retry_error}")
             return None
     
     def _create_schema_context(self) -> str:
         """Create schema context for Gemini"""
-        context = ""
-        for table_name, table_info in self.schema_info.items():
-            context += f"\nTable: {table_info['table']}\n"
-            context += f"Description: {table_info['description']}\n"
-            context += f"Columns: {', '.join(table_info['columns'])}\n"
-        return context
+        return self.db_manager.get_schema_prompt()
     
     def _clean_sql_response(self, response: str) -> str:
         """Clean and extract SQL query from Gemini response"""
         # Remove markdown code blocks
-        response = re.sub(r'```sql\n?', '', response)
-        response = re.sub(r'```\n?', '', response)
+        response = SQL_FENCE_RE.sub('', response)
         
         # Remove extra whitespace and newlines
         response = response.strip()
@@ -143,110 +339,6 @@ class GeminiQueryEngine:
         
         return response
     
-    def _fallback_sql_generation(self, user_query: str) -> str:
-        """Generate basic SQL queries when Gemini is not available"""
-        query_lower = user_query.lower()
-        
-        # Top ads by spend
-        if 'top' in query_lower and 'ads' in query_lower and 'spend' in query_lower:
-            limit = self._extract_number(user_query) or 10
-            return f"""
-            SELECT a.name, SUM(i.spend) as total_spend
-            FROM ads a
-            JOIN insights i ON a.id = i.ad_id
-            WHERE i.spend > 0
-            GROUP BY a.id, a.name
-            ORDER BY total_spend DESC
-            LIMIT {limit};
-            """
-        
-        # Top campaigns by spend
-        if 'top' in query_lower and 'campaign' in query_lower and 'spend' in query_lower:
-            limit = self._extract_number(user_query) or 10
-            return f"""
-            SELECT c.name, SUM(i.spend) as total_spend
-            FROM campaigns c
-            JOIN insights i ON c.id = i.campaign_id
-            WHERE i.spend > 0
-            GROUP BY c.id, c.name
-            ORDER BY total_spend DESC
-            LIMIT {limit};
-            """
-        
-        # Top adsets by spend
-        if 'top' in query_lower and ('adset' in query_lower or 'ad set' in query_lower) and 'spend' in query_lower:
-            limit = self._extract_number(user_query) or 10
-            return f"""
-            SELECT ads.name, SUM(i.spend) as total_spend
-            FROM adsets ads
-            JOIN insights i ON ads.id = i.adset_id
-            WHERE i.spend > 0
-            GROUP BY ads.id, ads.name
-            ORDER BY total_spend DESC
-            LIMIT {limit};
-            """
-        
-        # Average CTR
-        if 'average' in query_lower and 'ctr' in query_lower:
-            return """
-            SELECT AVG(ctr) as average_ctr
-            FROM insights
-            WHERE ctr > 0;
-            """
-        
-        # Campaign performance
-        if 'campaign' in query_lower and 'performance' in query_lower:
-            return """
-            SELECT 
-                c.name,
-                SUM(i.impressions) as total_impressions,
-                SUM(i.clicks) as total_clicks,
-                SUM(i.spend) as total_spend,
-                AVG(i.ctr) as avg_ctr
-            FROM campaigns c
-            JOIN insights i ON c.id = i.campaign_id
-            WHERE i.spend > 0
-            GROUP BY c.id, c.name
-            ORDER BY total_spend DESC
-            LIMIT 20;
-            """
-        
-        # Default query - show ads with spend
-        if 'ads' in query_lower or 'ad' in query_lower:
-            return """
-            SELECT 
-                a.name as ad_name,
-                SUM(i.spend) as total_spend,
-                SUM(i.impressions) as total_impressions,
-                SUM(i.clicks) as total_clicks
-            FROM ads a
-            JOIN insights i ON a.id = i.ad_id
-            WHERE i.spend > 0
-            GROUP BY a.id, a.name
-            ORDER BY total_spend DESC
-            LIMIT 10;
-            """
-        
-        # Default query - campaigns
-        return """
-        SELECT 
-            c.name as campaign_name,
-            SUM(i.spend) as total_spend,
-            SUM(i.impressions) as total_impressions,
-            SUM(i.clicks) as total_clicks
-        FROM campaigns c
-        JOIN insights i ON c.id = i.campaign_id
-        WHERE i.spend > 0
-        GROUP BY c.id, c.name
-        ORDER BY total_spend DESC
-        LIMIT 10;
-        """
-    
-    def _extract_number(self, text: str) -> Optional[int]:
-        """Extract number from text"""
-        numbers = re.findall(r'\d+', text)
-        return int(numbers[0]) if numbers else None
-    
     def _execute_sql_query(self, sql_query: str) -> pd.DataFrame:
         """Execute SQL query and return results"""
         try:
@@ -254,50 +346,83 @@ class GeminiQueryEngine:
             if not sql_query.strip().upper().startswith('SELECT'):
                 raise ValueError("Only SELECT queries are allowed")
             
-            # Execute query
-            data = self.db_manager.execute_query(sql_query)
+            # Execute query; COPY + pyarrow skips per-row tuple conversion for large results
+            data = self.db_manager.execute_query_arrow(sql_query)
             return data
             
         except Exception as e:
             logger.error(f"Error executing SQL query: {e}")
             raise
     
+    def _stream_model(self, prompt: str, cache_key: str) -> Iterator[str]:
+        """Yield Gemini's response text chunk by chunk, caching the full text once the stream completes"""
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        # Followers of an identical in-flight stream get its full text once the leader finishes, or stream
+        # their own response if the leader doesn't finish in time
+        future, leader = in_flight.claim(cache_key)
+        if not leader:
+            try:
+                text = future.result(timeout=in_flight.wait_timeout)
+            except TimeoutError:
+                logger.warning(f"In-flight Gemini stream still running after {in_flight.wait_timeout}s, calling directly")
+                yield from self._generate_stream(prompt, cache_key)
+                return
+            yield text
+            return
+        
+        try:
+            text = yield from self._generate_stream(prompt, cache_key)
+            future.set_result(text)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if not future.done():
+                # The consumer stopped reading before the stream finished
+                future.set_exception(RuntimeError("Gemini response stream was abandoned"))
+            in_flight.release(cache_key)
+    
+    def _generate_stream(self, prompt: str, cache_key: str) -> Iterator[str]:
+        """Yield Gemini's response chunks, then cache the full text and return it"""
+        chunks = []
+        for chunk in self.model.generate_content(prompt, stream=True):
+            chunks.append(chunk.text)
+            yield chunk.text
+        text = ''.join(chunks)
+        response_cache.set(cache_key, text)
+        return text
+    
     def _generate_insights(self, user_query: str, data: pd.DataFrame, sql_query: str) -> str:
         """Generate insights from query results using Gemini"""
+        return ''.join(self._stream_insights(user_query, data, sql_query))
+    
+    def _stream_insights(self, user_query: str, data: pd.DataFrame, sql_query: str) -> Iterator[str]:
+        """Yield insights from query results as Gemini generates them"""
         try:
             if data is None or data.empty:
-                return "No data found for the given query."
+                yield "No data found for the given query."
+                return
             
             # Create data summary
             data_summary = self._create_data_summary(data)
             
-            prompt = f"""
-            Analyze the following data and provide insights based on the user's question.
-            
-            User Question: {user_query}
-            SQL Query: {sql_query}
-            Data Summary: {data_summary}
-            
-            Provide a concise analysis with:
-            1. Key findings from the data
-            2. Notable trends or patterns
-            3. Actionable insights or recommendations
-            
-            Keep the response under 200 words and focus on business value.
-            
-            Analysis:
-            """
+            prompt = INSIGHTS_PROMPT.format(user_query=user_query, sql_query=sql_query, data_summary=data_summary)
             
             if hasattr(self, 'model'):
-                response = self.model.generate_content(prompt)
-                return response.text
+                # The summary carries the result rows, so a cached analysis is only reused for the same data
+                cache_key = self._cache_key('insights', self._normalize_query(user_query), sql_query, data_summary)
+                yield from self._stream_model(prompt, cache_key)
             else:
                 # Fallback insights
-                return self._generate_fallback_insights(data, user_query)
+                yield self._generate_fallback_insights(data, user_query)
                 
         except Exception as e:
             logger.error(f"Error generating insights: {e}")
-            return self._generate_fallback_insights(data, user_query)
+            yield self._generate_fallback_insights(data, user_query)
     
     def _create_data_summary(self, data: pd.DataFrame) -> str:
         """Create a summary of the data for Gemini analysis"""
@@ -310,13 +435,20 @@ class GeminiQueryEngine:
         numeric_cols = data.select_dtypes(include=['number']).columns
         if len(numeric_cols) > 0:
             summary += "Numeric Data Summary:\n"
-            for col in numeric_cols[:3]:  # Limit to first 3 numeric columns
-                summary += f"{col}: min={data[col].min():.2f}, max={data[col].max():.2f}, mean={data[col].mean():.2f}\n"
-        
-        # Add sample rows
+            # Column-wise reductions over one 2-D array of the first 3 numeric columns; like pandas they skip
+            # nulls, and all-null columns give NaN without the warnings nanmin/nanmax/nanmean emit
+            columns = numeric_cols[:3]
+            values = data[columns].to_numpy(dtype=np.float64)
+            for col, low, high, mean in zip(columns, np.fmin.reduce(values, axis=0), np.fmax.reduce(values, axis=0),
+                                            column_means(values)):
+                summary += f"{col}: min={low:.2f}, max={high:.2f}, mean={mean:.2f}\n"
+        
+        # Add sample rows as CSV, which is denser than the padded to_string table
         if len(data) > 0:
-            summary += f"\nSample Data (first 3 rows):\n{data.head(3).to_string()}"
+            summary += f"\nSample Data (first 3 rows):\n{data.iloc[:3, :SUMMARY_SAMPLE_COLUMNS].to_csv(index=False)}"
         
+        if len(summary) > SUMMARY_MAX_CHARS:
+            summary = summary[:SUMMARY_MAX_CHARS] + "...[truncated]"
         return summary
     
     def _generate_fallback_insights(self, data: pd.DataFrame, user_query: str) -> str:
@@ -326,60 +458,59 @@ class GeminiQueryEngine:
         # Basic data description
         insights.append(f"Found {len(data)} records matching your query.")
         
-        # Analyze numeric columns
+        # Analyze numeric columns; totals and averages come from one reduction each over a 2-D array of them
         numeric_cols = data.select_dtypes(include=['number']).columns
+        values = data[numeric_cols].to_numpy(dtype=np.float64)
+        totals = dict(zip(numeric_cols, np.nansum(values, axis=0)))
+        averages = dict(zip(numeric_cols, column_means(values)))
         for col in numeric_cols:
             if 'spend' in col.lower():
-                total = data[col].sum()
-                avg = data[col].mean()
-                insights.append(f"Total {col}: ${total:,.2f}, Average: ${avg:,.2f}")
+                insights.append(f"Total {col}: ${totals[col]:,.2f}, Average: ${averages[col]:,.2f}")
             elif 'ctr' in col.lower():
-                avg = data[col].mean()
-                insights.append(f"Average {col}: {avg:.2f}%")
+                insights.append(f"Average {col}: {averages[col]:.2f}%")
             elif col.lower() in ['impressions', 'clicks']:
-                total = data[col].sum()
-                insights.append(f"Total {col}: {total:,}")
+                # Sums are taken in float64
+                insights.append(f"Total {col}: {int(totals[col]):,}")
         
         # Top performers
         if len(data) > 1:
             if 'name' in data.columns and len(numeric_cols) > 0:
                 top_col = numeric_cols[0]
-                top_performer = data.nlargest(1, top_col)['name'].iloc[0]
+                top_performer = data.at[data[top_col].idxmax(), 'name']
                 insights.append(f"Top performer by {top_col}: {top_performer}")
         
         return " ".join(insights) if insights else "Data retrieved successfully."
     
     def _is_analytical_query(self, user_query: str) -> bool:
         """Check if query requires analytical processing rather than simple SQL"""
-        analytical_keywords = [
-            'roas', 'cac', 'cpr', 'ctr trend', 'vs', 'compared to', 'comparison',
-            'best performing', 'worst performing', 'burning budget', 'low performance',
-            'drops', 'spikes', 'anomalies', 'top creatives', 'learning phase',
-            'limited by budget', 'audience size', 'impact of changes', 'budget shifts',
-            'over-spending', 'under-spending', 'unexpected spike', 'same day last week',
-            'yesterday vs today', 'past 7 days', 'trend analysis', 'performance analysis'
-        ]
-        
-        query_lower = user_query.lower()
-        return any(keyword in query_lower for keyword in analytical_keywords)
+        return ANALYTICAL_RE.search(user_query) is not None
     
-    def _process_analytical_query(self, user_query: str) -> Dict[str, Any]:
+    def _process_analytical_query(self, user_query: str, stream: bool = False) -> Dict[str, Any]:
         """Process complex analytical queries with calculations and insights"""
         try:
             # Get all available data from database
             all_data = self._get_comprehensive_data()
             
-            # Generate analytical response using Gemini
-            analytical_response = self._generate_analytical_insights(user_query, all_data)
-            
-            return {
+            result = {
                 'sql_query': 'Analytical Query (No SQL Required)',
                 'data': all_data.get('summary', pd.DataFrame()),
-                'insights': analytical_response,
+                'insights': None,
                 'error': None,
                 'query_type': 'analytical'
             }
             
+            insights_df = all_data.get('insights')
+            if insights_df is None or insights_df.empty:
+                result['insights'] = "No recent insights data available for analysis."
+                return result
+            
+            # Generate analytical response using Gemini
+            if stream:
+                result['insights_stream'] = self._stream_analytical_insights(user_query, all_data)
+            else:
+                result['insights'] = self._generate_analytical_insights(user_query, all_data)
+            return result
+            
         except Exception as e:
             logger.error(f"Error processing analytical query: {e}")
             return {
@@ -393,54 +524,98 @@ class GeminiQueryEngine:
     def _get_comprehensive_data(self) -> Dict[str, Any]:
         """Get comprehensive data for analytical processing"""
         try:
-            # Get recent insights data with calculations
-            insights_query = """
-            SELECT 
-                date_start,
-                spend,
-                impressions,
-                clicks,
-                reach,
-                frequency,
-                cpm,
-                cpc,
-                ctr,
-                CASE WHEN clicks > 0 THEN spend / clicks ELSE 0 END as actual_cpc,
-                CASE WHEN impressions > 0 THEN (clicks::float / impressions::float) * 100 ELSE 0 END as actual_ctr,
-                CASE WHEN impressions > 0 THEN (spend / impressions) * 1000 ELSE 0 END as actual_cpm
-            FROM insights 
-            WHERE spend > 0
-            ORDER BY date_start DESC
-            LIMIT 30
-            """
-            
-            insights_data = self.db_manager.execute_query(insights_query)
-            
-            # Get campaign summary
-            campaigns_query = """
-            SELECT 
-                COUNT(*) as total_campaigns,
-                COUNT(CASE WHEN status = 'ACTIVE' THEN 1 END) as active_campaigns,
-                AVG(daily_budget) as avg_daily_budget,
-                SUM(daily_budget) as total_daily_budget
-            FROM campaigns
+            # Recent insights with calculated rates, their totals and latest day-over-day change, plus
+            # campaign and ad status counts, fetched in one round trip; each part comes back as JSON in
+            # its own column of a single row, with the aggregation done by Postgres
+            comprehensive_query = """
+            WITH recent AS (
+                SELECT 
+                    date_start,
+                    spend,
+                    impressions,
+                    clicks,
+                    reach,
+                    frequency,
+                    cpm,
+                    cpc,
+                    ctr,
+                    CASE WHEN clicks > 0 THEN spend / clicks ELSE 0 END as actual_cpc,
+                    CASE WHEN impressions > 0 THEN (clicks::float / impressions::float) * 100 ELSE 0 END as actual_ctr,
+                    CASE WHEN impressions > 0 THEN (spend / impressions) * 1000 ELSE 0 END as actual_cpm
+                FROM insights 
+                WHERE spend > 0
+                ORDER BY date_start DESC
+                LIMIT 30
+            ),
+            daily AS (
+                SELECT
+                    date_start,
+                    SUM(spend) as spend,
+                    LAG(SUM(spend)) OVER (ORDER BY date_start) as previous_spend
+                FROM recent
+                GROUP BY date_start
+            )
+            SELECT
+                (SELECT COALESCE(json_agg(recent), '[]'::json) FROM recent) as insights,
+                (
+                    SELECT row_to_json(recent_totals)
+                    FROM (
+                        SELECT
+                            SUM(spend) as total_spend,
+                            SUM(impressions) as total_impressions,
+                            SUM(clicks) as total_clicks,
+                            AVG(actual_ctr) as avg_ctr,
+                            AVG(actual_cpm) as avg_cpm,
+                            AVG(actual_cpc) as avg_cpc
+                        FROM recent
+                    ) recent_totals
+                ) as totals,
+                (
+                    SELECT row_to_json(latest)
+                    FROM (
+                        SELECT
+                            spend as latest_spend,
+                            previous_spend,
+                            CASE WHEN previous_spend > 0 THEN (spend - previous_spend) / previous_spend * 100 ELSE 0 END as spend_change
+                        FROM daily
+                        ORDER BY date_start DESC
+                        LIMIT 1
+                    ) latest
+                ) as latest_day,
+                (
+                    SELECT row_to_json(campaign_counts)
+                    FROM (
+                        SELECT 
+                            COUNT(*) as total_campaigns,
+                            COUNT(CASE WHEN status = 'ACTIVE' THEN 1 END) as active_campaigns,
+                            AVG(daily_budget) as avg_daily_budget,
+                            SUM(daily_budget) as total_daily_budget
+                        FROM campaigns
+                    ) campaign_counts
+                ) as campaigns_summary,
+                (
+                    SELECT row_to_json(ad_counts)
+                    FROM (
+                        SELECT 
+                            COUNT(*) as total_ads,
+                            COUNT(CASE WHEN status = 'ACTIVE' THEN 1 END) as active_ads,
+                            COUNT(CASE WHEN status = 'PAUSED' THEN 1 END) as paused_ads
+                        FROM ads
+                    ) ad_counts
+                ) as ads_summary
             """
             
-            campaigns_summary = self.db_manager.execute_query(campaigns_query)
-            
-            # Get ads summary  
-            ads_query = """
-            SELECT 
-                COUNT(*) as total_ads,
-                COUNT(CASE WHEN status = 'ACTIVE' THEN 1 END) as active_ads,
-                COUNT(CASE WHEN status = 'PAUSED' THEN 1 END) as paused_ads
-            FROM ads
-            """
-            
-            ads_summary = self.db_manager.execute_query(ads_query)
+            row = self.db_manager.execute_prepared('analytical_context', comprehensive_query).iloc[0]
+            insights_data = pd.DataFrame(row['insights'])
+            if 'date_start' in insights_data:
+                # json_agg returns dates as ISO strings; parse them once, deduplicated, for the displayed frame
+                insights_data['date_start'] = pd.to_datetime(insights_data['date_start'], cache=True)
+            campaigns_summary = pd.DataFrame([row['campaigns_summary']])
+            ads_summary = pd.DataFrame([row['ads_summary']])
             
             return {
                 'insights': insights_data,
+                'totals': {**(row['totals'] or {}), **(row['latest_day'] or {})},
                 'campaigns_summary': campaigns_summary,
                 'ads_summary': ads_summary,
                 'summary': insights_data  # For display in UI
@@ -452,80 +627,51 @@ class GeminiQueryEngine:
     
     def _generate_analytical_insights(self, user_query: str, data: Dict[str, Any]) -> str:
         """Generate analytical insights using Gemini with comprehensive data analysis"""
+        return ''.join(self._stream_analytical_insights(user_query, data))
+    
+    def _stream_analytical_insights(self, user_query: str, data: Dict[str, Any]) -> Iterator[str]:
+        """Yield analytical insights as Gemini generates them"""
         try:
             insights_df = data.get('insights', pd.DataFrame())
             campaigns_df = data.get('campaigns_summary', pd.DataFrame())
             ads_df = data.get('ads_summary', pd.DataFrame())
             
             if insights_df.empty:
-                return "No recent insights data available for analysis."
+                yield "No recent insights data available for analysis."
+                return
             
             # Create data summary for analysis
-            data_summary = self._create_analytical_summary(insights_df, campaigns_df, ads_df)
-            
-            prompt = f"""
-            You are a Facebook Ads performance analyst. Analyze the provided data and answer the user's question with detailed insights, calculations, and recommendations.
-            
-            User Question: {user_query}
-            
-            Available Data Summary:
-            {data_summary}
+            totals = data.get('totals', {})
+            data_summary = self._create_analytical_summary(totals, campaigns_df, ads_df)
             
-            Please provide:
-            1. Direct answer to the user's question
-            2. Relevant calculations (ROAS, CAC, CPR, CTR trends, etc.)
-            3. Performance insights and patterns
-            4. Actionable recommendations
-            5. Any notable anomalies or concerns
-            
-            Format your response as a comprehensive analysis with clear sections and specific numbers where available.
-            If the question asks for comparisons (vs yesterday, last week, etc.), calculate and present the differences.
-            If the question asks about trends, analyze the progression over time.
-            If the question asks about performance, identify best and worst performers with specific metrics.
-            
-            Make calculations based on the actual data provided. For metrics not directly available, explain what additional data would be needed.
-            """
+            prompt = ANALYTICAL_PROMPT.format(user_query=user_query, data_summary=data_summary)
             
             if hasattr(self, 'model'):
-                response = self.model.generate_content(prompt)
-                return response.text
+                cache_key = self._cache_key('analysis', self._normalize_query(user_query), data_summary)
+                yield from self._stream_model(prompt, cache_key)
             else:
-                return self._generate_fallback_analytical_insights(user_query, insights_df)
+                yield self._generate_fallback_analytical_insights(user_query, totals)
                 
         except Exception as e:
             logger.error(f"Error generating analytical insights: {e}")
-            return f"Error analyzing data: {str(e)}"
+            yield f"Error analyzing data: {str(e)}"
     
-    def _create_analytical_summary(self, insights_df: pd.DataFrame, campaigns_df: pd.DataFrame, ads_df: pd.DataFrame) -> str:
-        """Create comprehensive data summary for analytical processing"""
+    def _create_analytical_summary(self, totals: Dict[str, Any], campaigns_df: pd.DataFrame, ads_df: pd.DataFrame) -> str:
+        """Create comprehensive data summary for analytical processing from the database-side totals"""
         summary = []
         
-        if not insights_df.empty:
-            # Recent performance metrics
-            recent_spend = insights_df['spend'].sum()
-            recent_impressions = insights_df['impressions'].sum()
-            recent_clicks = insights_df['clicks'].sum()
-            avg_ctr = insights_df['actual_ctr'].mean()
-            avg_cpm = insights_df['actual_cpm'].mean()
-            avg_cpc = insights_df['actual_cpc'].mean()
-            
+        if totals:
             summary.append(f"Recent Performance (Last 30 data points):")
-            summary.append(f"- Total Spend: ${recent_spend:,.2f}")
-            summary.append(f"- Total Impressions: {recent_impressions:,}")
-            summary.append(f"- Total Clicks: {recent_clicks:,}")
-            summary.append(f"- Average CTR: {avg_ctr:.2f}%")
-            summary.append(f"- Average CPM: ${avg_cpm:.2f}")
-            summary.append(f"- Average CPC: ${avg_cpc:.2f}")
+            summary.append(f"- Total Spend: ${totals['total_spend']:,.2f}")
+            summary.append(f"- Total Impressions: {int(totals['total_impressions']):,}")
+            summary.append(f"- Total Clicks: {int(totals['total_clicks']):,}")
+            summary.append(f"- Average CTR: {totals['avg_ctr']:.2f}%")
+            summary.append(f"- Average CPM: ${totals['avg_cpm']:.2f}")
+            summary.append(f"- Average CPC: ${totals['avg_cpc']:.2f}")
             
-            # Daily trends
-            if 'date_start' in insights_df.columns:
-                insights_df['date_start'] = pd.to_datetime(insights_df['date_start'])
-                daily_spend = insights_df.groupby('date_start')['spend'].sum().sort_index()
-                if len(daily_spend) > 1:
-                    latest_spend = daily_spend.iloc[-1]
-                    previous_spend = daily_spend.iloc[-2] if len(daily_spend) > 1 else 0
-                    spend_change = ((latest_spend - previous_spend) / previous_spend * 100) if previous_spend > 0 else 0
-                    summary.append(f"- Latest day spend: ${latest_spend:.2f} (Change: {spend_change:+.1f}%)")
+            # Daily trends; there is no previous day when the recent rows cover a single date
+            if totals.get('previous_spend') is not None:
+                summary.append(f"- Latest day spend: ${totals['latest_spend']:.2f} (Change: {totals['spend_change']:+.1f}%)")
         
         if not campaigns_df.empty:
             campaigns_data = campaigns_df.iloc[0]
@@ -543,41 +689,28 @@ class GeminiQueryEngine:
         
         return "\\n".join(summary)
     
-    def _generate_fallback_analytical_insights(self, user_query: str, insights_df: pd.DataFrame) -> str:
+    def _generate_fallback_analytical_insights(self, user_query: str, totals: Dict[str, Any]) -> str:
         """Generate basic analytical insights when Gemini is not available"""
-        if insights_df.empty:
+        if not totals:
             return "No data available for analysis."
         
         insights = []
         query_lower = user_query.lower()
         
-        # Calculate basic metrics
-        total_spend = insights_df['spend'].sum()
-        total_impressions = insights_df['impressions'].sum()
-        total_clicks = insights_df['clicks'].sum()
-        avg_ctr = insights_df['actual_ctr'].mean()
-        avg_cpm = insights_df['actual_cpm'].mean()
-        
+        # Metrics are aggregated by the database query
         insights.append(f"**Performance Summary:**")
-        insights.append(f"Total Spend: ${total_spend:,.2f}")
-        insights.append(f"Total Impressions: {total_impressions:,}")
-        insights.append(f"Total Clicks: {total_clicks:,}")
-        insights.append(f"Average CTR: {avg_ctr:.2f}%")
-        insights.append(f"Average CPM: ${avg_cpm:.2f}")
-        
-        # Trend analysis if date data available
-        if 'date_start' in insights_df.columns:
-            insights_df['date_start'] = pd.to_datetime(insights_df['date_start'])
-            daily_spend = insights_df.groupby('date_start')['spend'].sum().sort_index()
-            
-            if len(daily_spend) > 1:
-                insights.append(f"\\n**Trend Analysis:**")
-                latest_spend = daily_spend.iloc[-1]
-                previous_spend = daily_spend.iloc[-2]
-                change = ((latest_spend - previous_spend) / previous_spend * 100) if previous_spend > 0 else 0
-                insights.append(f"Latest day spend: ${latest_spend:.2f}")
-                insights.append(f"Previous day spend: ${previous_spend:.2f}")
-                insights.append(f"Day-over-day change: {change:+.1f}%")
+        insights.append(f"Total Spend: ${totals['total_spend']:,.2f}")
+        insights.append(f"Total Impressions: {int(totals['total_impressions']):,}")
+        insights.append(f"Total Clicks: {int(totals['total_clicks']):,}")
+        insights.append(f"Average CTR: {totals['avg_ctr']:.2f}%")
+        insights.append(f"Average CPM: ${totals['avg_cpm']:.2f}")
+        
+        # Trend analysis if more than one day is covered
+        if totals.get('previous_spend') is not None:
+            insights.append(f"\\n**Trend Analysis:**")
+            insights.append(f"Latest day spend: ${totals['latest_spend']:.2f}")
+            insights.append(f"Previous day spend: ${totals['previous_spend']:.2f}")
+            insights.append(f"Day-over-day change: {totals['spend_change']:+.1f}%")
         
         if 'roas' in query_lower or 'return' in query_lower:
             insights.append(f"\\n**Note:** ROAS calculation requires conversion/revenue data which is not available in current dataset.")
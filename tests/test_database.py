@@ -0,0 +1,141 @@
+import io
+import os
+import pytest
+import numpy as np
+import pandas as pd
+from pyarrow import csv as pa_csv
+from sqlalchemy import text
+
+from database import DatabaseManager, arrow_type, is_single_statement
+
+needs_postgres = pytest.mark.skipif(not os.getenv('DATABASE_URL'), reason="needs a Postgres DATABASE_URL")
+
+REGRESSION_CAMPAIGN_ID = 999000000000001
+
+@pytest.fixture
+def offline_db_manager(monkeypatch):
+    """A DatabaseManager whose engine is never connected"""
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://user@localhost/unused')
+    monkeypatch.setenv('DB_AUTO_CREATE', '0')
+    return DatabaseManager()
+
+def read_copy_csv(table, columns, buffer):
+    """Parse a COPY CSV buffer the way Postgres would load it: unquoted empties are NULL"""
+    convert_options = pa_csv.ConvertOptions(
+        column_types={col: arrow_type(table.c[col]) for col in columns},
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=False
+    )
+    buffer = io.BytesIO(buffer.getvalue().encode())
+    return pa_csv.read_csv(
+        buffer, read_options=pa_csv.ReadOptions(column_names=columns), convert_options=convert_options
+    ).to_pylist()
+
+TRICKY_NAME = 'He said "hi", then\nleft'
+
+def test_records_to_csv_round_trip(offline_db_manager):
+    table = offline_db_manager.campaigns_table
+    records = [
+        {'id': '1', 'account_id': 'act_1', 'name': TRICKY_NAME, 'status': 'ACTIVE',
+         'objective': None, 'daily_budget': 12.5, 'data': {'tags': ['a', None]}},
+        {'id': '2', 'account_id': 'act_1', 'name': '', 'status': 'NOT_A_STATUS',
+         'objective': 'REACH', 'daily_budget': None, 'data': None}
+    ]
+    
+    columns, buffer = offline_db_manager._records_to_csv(table, records)
+    rows = read_copy_csv(table, columns, buffer)
+    
+    assert rows[0]['name'] == TRICKY_NAME
+    assert rows[0]['objective'] is None
+    assert rows[0]['daily_budget'] == 12.5
+    assert rows[0]['data'] == '{"tags":["a",null]}'
+    assert rows[1]['status'] is None
+    assert rows[1]['daily_budget'] is None
+    assert rows[1]['data'] is None
+
+def test_dataframe_to_csv_round_trip(offline_db_manager):
+    table = offline_db_manager.insights_table
+    df = pd.DataFrame({
+        'id': ['10', '11', '10'],
+        'account_id': ['act_1', 'act_1', 'act_1'],
+        'campaign_id': ['5', None, '5'],
+        'date_start': pd.to_datetime(['2026-10-01', '2026-10-01', '2026-10-01']),
+        'impressions': [100, np.nan, 300],
+        'spend': [1.5, np.nan, 3.5],
+        # Parquet round trips turn list payloads into arrays
+        'actions': [np.array([{'action_type': 'click'}], dtype=object), None, [{'action_type': 'view'}]]
+    })
+    
+    columns, buffer = offline_db_manager._dataframe_to_csv(table, df)
+    rows = read_copy_csv(table, columns, buffer)
+    
+    # The later of two rows with the same key wins
+    assert [row['id'] for row in rows] == ['11', '10']
+    assert rows[0]['campaign_id'] is None
+    assert rows[0]['impressions'] is None
+    assert rows[0]['spend'] is None
+    assert rows[0]['actions'] is None
+    assert rows[1]['impressions'] == 300
+    assert rows[1]['actions'] == '[{"action_type":"view"}]'
+
+def test_dataframe_to_csv_serializes_array_payloads(offline_db_manager):
+    table = offline_db_manager.insights_table
+    df = pd.DataFrame({
+        'id': ['10'],
+        'account_id': ['act_1'],
+        'date_start': pd.to_datetime(['2026-10-01']),
+        'actions': [np.array([{'action_type': 'click', 'value': '2'}], dtype=object)]
+    })
+    
+    columns, buffer = offline_db_manager._dataframe_to_csv(table, df)
+    
+    assert read_copy_csv(table, columns, buffer)[0]['actions'] == '[{"action_type":"click","value":"2"}]'
+
+@pytest.mark.parametrize('query', [
+    "SELECT 1",
+    "SELECT name FROM ads WHERE name = 'a;b)'",
+    'SELECT "odd;name" FROM ads',
+    "SELECT $tag$ ); $tag$ AS x",
+    "SELECT COUNT(*) FROM (SELECT 1) q -- trailing ) ;",
+    "SELECT 1 /* ; ) */ AS x",
+    "SELECT E'it\\'s' AS x"
+])
+def test_single_statements_are_accepted(query):
+    assert is_single_statement(query)
+
+@pytest.mark.parametrize('query', [
+    "SELECT 1) TO STDOUT; DELETE FROM probe; --",
+    "SELECT 1; SELECT 2",
+    "SELECT (1",
+    # Postgres reads E'\'' as one quote, leaving the rest as code
+    "SELECT E'\\'' ) TO STDOUT; DELETE FROM probe; --'",
+    # With standard strings a backslash doesn't escape the quote
+    "SELECT '\\' ) TO STDOUT; DELETE FROM probe; --'",
+    # The line comment is inside a dollar-quoted string, so the ')' is code
+    "SELECT $$--$$) TO STDOUT; DELETE FROM probe",
+    # Postgres nests block comments; the check ends them at the first */ and errs on the side of rejecting
+    "SELECT 1 /* /* */ ) ; DELETE FROM probe */"
+])
+def test_statements_that_escape_a_wrapper_are_rejected(query):
+    assert not is_single_statement(query)
+
+@needs_postgres
+def test_second_startup_keeps_rows():
+    """Restarting must not see the enum status columns as changed and recreate the tables"""
+    db_manager = DatabaseManager()
+    db_manager.store_campaigns([{
+        'id': str(REGRESSION_CAMPAIGN_ID),
+        'account_id': 'act_0',
+        'name': 'Restart regression campaign',
+        'status': 'ACTIVE'
+    }])
+    try:
+        DatabaseManager()
+        
+        stored = db_manager.execute_query(
+            "SELECT id FROM campaigns WHERE id = :id", params={'id': REGRESSION_CAMPAIGN_ID}
+        )
+        assert len(stored) == 1
+    finally:
+        with db_manager.engine.begin() as connection:
+            connection.execute(text("DELETE FROM campaigns WHERE id = :id"), {'id': REGRESSION_CAMPAIGN_ID})
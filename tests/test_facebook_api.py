@@ -0,0 +1,153 @@
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+import orjson
+import pandas as pd
+import pytest
+
+import facebook_api
+from facebook_api import FacebookAPI, MAX_BATCH_SIZE
+
+class FakeResponse:
+    """Just enough of requests.Response for the client"""
+    
+    def __init__(self, body=None, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = orjson.dumps(body) if body is not None else b''
+        self.text = self.content.decode()
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise facebook_api.requests.exceptions.HTTPError(response=self)
+
+@pytest.fixture
+def api():
+    client = FacebookAPI()
+    client.session = mock.Mock()
+    return client
+
+def window_dates(params):
+    time_range = orjson.loads(params['time_range'])
+    return date.fromisoformat(time_range['since']), date.fromisoformat(time_range['until'])
+
+@pytest.mark.parametrize('days, window_days', [(30, 5), (7, 3), (10, 5)])
+def test_insights_windows_are_contiguous_and_cover_the_preset(api, days, window_days):
+    requests_ = api._insights_requests('act_1', f'last_{days}d', window_days=window_days)
+    windows = [window_dates(params) for _, params in requests_]
+    
+    today = datetime.now().date()
+    assert windows[0][0] == today - timedelta(days=days)
+    assert windows[-1][1] == today - timedelta(days=1)
+    for (_, until), (since, _) in zip(windows, windows[1:]):
+        assert since == until + timedelta(days=1)
+    assert all(since <= until for since, until in windows)
+    assert all(endpoint == 'act_1/insights' for endpoint, _ in requests_)
+
+@pytest.mark.parametrize('date_preset', ['last_3d', 'this_month', 'yesterday'])
+def test_insights_presets_that_cannot_be_split_stay_one_request(api, date_preset):
+    requests_ = api._insights_requests('act_1', date_preset, window_days=5)
+    
+    assert len(requests_) == 1
+    assert requests_[0][1]['date_preset'] == date_preset
+    assert 'time_range' not in requests_[0][1]
+
+def test_fresh_response_is_served_from_cache(api):
+    api.session.get.return_value = FakeResponse({'data': [1]})
+    
+    assert api._make_request('act_1/campaigns', {'fields': 'id'}) == {'data': [1]}
+    assert api._make_request('act_1/campaigns', {'fields': 'id'}) == {'data': [1]}
+    assert api.session.get.call_count == 1
+
+def test_stale_response_is_revalidated_with_its_etag(api):
+    api.session.get.return_value = FakeResponse({'data': [1]}, headers={'ETag': '"v1"'})
+    api._make_request('act_1/campaigns')
+    key, (fetched_at, etag, body) = next(iter(api._cache.items()))
+    api._cache[key] = (fetched_at - 120, etag, body)
+    
+    # Graph doesn't always repeat the ETag on a 304
+    api.session.get.return_value = FakeResponse(status_code=304)
+    assert api._make_request('act_1/campaigns') == {'data': [1]}
+    
+    assert api.session.get.call_args.kwargs['headers'] == {'If-None-Match': '"v1"'}
+    assert api._cache[key][1] == '"v1"'
+
+def test_cache_evicts_least_recently_used_entries(api, monkeypatch):
+    monkeypatch.setattr(facebook_api, 'RESPONSE_CACHE_MAX_ENTRIES', 2)
+    now = facebook_api.time.time()
+    api._cache_set('a', (now, None, 'a'))
+    api._cache_set('b', (now, None, 'b'))
+    api._cache_get('a')
+    api._cache_set('c', (now, None, 'c'))
+    
+    assert list(api._cache) == ['a', 'c']
+
+def test_cache_drops_entries_past_max_age(api):
+    now = facebook_api.time.time()
+    api._cache_set('old', (now - facebook_api.RESPONSE_CACHE_MAX_AGE - 1, '"v1"', 'old'))
+    
+    assert api._cache_get('old') is None
+    assert 'old' not in api._cache
+    
+    api._cache_set('older', (now - facebook_api.RESPONSE_CACHE_MAX_AGE - 1, None, 'older'))
+    api._cache_set('new', (now, None, 'new'))
+    assert list(api._cache) == ['new']
+
+def test_batch_request_chunks_at_max_batch_size(api):
+    def post(url, data, timeout):
+        batch = orjson.loads(data['batch'])
+        return FakeResponse([{'code': 200, 'body': orjson.dumps({'n': i}).decode()} for i in range(len(batch))])
+    api.session.post.side_effect = post
+    requests_ = [(f'act_{i}/campaigns', {'fields': 'id'}) for i in range(2 * MAX_BATCH_SIZE + 20)]
+    
+    bodies = api._batch_request(requests_)
+    
+    sizes = [len(orjson.loads(call.kwargs['data']['batch'])) for call in api.session.post.call_args_list]
+    assert sizes == [MAX_BATCH_SIZE, MAX_BATCH_SIZE, 20]
+    assert len(bodies) == len(requests_)
+
+def test_prime_cache_skips_failed_batch_items(api):
+    api.session.post.return_value = FakeResponse([
+        {'code': 200, 'body': orjson.dumps({'data': ['ok']}).decode()},
+        {'code': 400, 'body': orjson.dumps({'error': {'message': 'bad'}}).decode()}
+    ])
+    api._prime_cache([('act_1/campaigns', {'fields': 'id'}), ('act_1/ads', {'fields': 'id'})])
+    
+    cached = {key[1]: entry[2] for key, entry in api._cache.items()}
+    assert cached == {'act_1/campaigns': {'data': ['ok']}}
+
+def insight_rows(account_id):
+    return pd.DataFrame({
+        'account_id': account_id,
+        'campaign_id': ['1', '1', None],
+        'adset_id': ['11', '12', None],
+        'ad_id': ['111', '121', None],
+        'date_start': ['2026-10-01', '2026-10-01', '2026-10-02']
+    })
+
+def test_insight_ids_do_not_depend_on_row_order():
+    rows = insight_rows('act_1')
+    ids = FacebookAPI._insight_ids(rows)
+    reversed_ids = FacebookAPI._insight_ids(rows.iloc[::-1].reset_index(drop=True))
+    
+    assert list(reversed_ids) == list(ids)[::-1]
+    assert ids.is_unique
+
+def test_insight_ids_differ_across_accounts():
+    ids_1 = set(FacebookAPI._insight_ids(insight_rows('act_1')))
+    ids_2 = set(FacebookAPI._insight_ids(insight_rows('act_2')))
+    
+    # Includes the account-level row, which has no campaign, ad set or ad id
+    assert not ids_1 & ids_2
+
+def test_insight_ids_fit_a_bigint_column():
+    ids = FacebookAPI._insight_ids(insight_rows('act_1'))
+    
+    # Raises if any id isn't a signed 64-bit integer
+    ids.astype('int64')
+
+def test_insight_ids_match_for_parsed_and_text_dates():
+    rows = insight_rows('act_1')
+    parsed = rows.assign(date_start=pd.to_datetime(rows['date_start']))
+    
+    assert list(FacebookAPI._insight_ids(parsed)) == list(FacebookAPI._insight_ids(rows))
@@ -0,0 +1,93 @@
+import threading
+import warnings
+
+import numpy as np
+import pytest
+
+from gemini_query import InFlightRequests, column_means
+
+def start_leader(in_flight, key, result=None, error=None):
+    """Run a leader call in a thread that blocks until the returned gate is set"""
+    started, gate = threading.Event(), threading.Event()
+    outcome = {}
+    
+    def call():
+        started.set()
+        gate.wait(5)
+        if error:
+            raise error
+        return result
+    
+    def run():
+        try:
+            outcome['result'] = in_flight.run(key, call)
+        except Exception as e:
+            outcome['error'] = e
+    
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait(5)
+    return gate, thread, outcome
+
+def run_follower(in_flight, key, call):
+    """Call in_flight.run from another thread and return what it produced"""
+    outcome = {}
+    
+    def run():
+        try:
+            outcome['result'] = in_flight.run(key, call)
+        except Exception as e:
+            outcome['error'] = e
+    
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+def test_follower_gets_the_leaders_result():
+    in_flight = InFlightRequests()
+    gate, leader, _ = start_leader(in_flight, 'q', result='answer')
+    follower, outcome = run_follower(in_flight, 'q', lambda: pytest.fail("follower made its own call"))
+    
+    gate.set()
+    leader.join(5)
+    follower.join(5)
+    assert outcome == {'result': 'answer'}
+
+def test_follower_gets_the_leaders_exception():
+    in_flight = InFlightRequests()
+    gate, leader, _ = start_leader(in_flight, 'q', error=RuntimeError("quota"))
+    follower, outcome = run_follower(in_flight, 'q', lambda: pytest.fail("follower made its own call"))
+    
+    gate.set()
+    leader.join(5)
+    follower.join(5)
+    assert isinstance(outcome['error'], RuntimeError)
+    assert str(outcome['error']) == "quota"
+
+def test_follower_calls_directly_when_the_leader_stalls():
+    in_flight = InFlightRequests(wait_timeout=0.05)
+    gate, leader, leader_outcome = start_leader(in_flight, 'q', result='slow')
+    follower, outcome = run_follower(in_flight, 'q', lambda: 'own')
+    
+    follower.join(5)
+    assert outcome == {'result': 'own'}
+    
+    gate.set()
+    leader.join(5)
+    assert leader_outcome == {'result': 'slow'}
+
+def test_a_finished_key_starts_a_fresh_call():
+    in_flight = InFlightRequests()
+    
+    assert in_flight.run('q', lambda: 1) == 1
+    assert in_flight.run('q', lambda: 2) == 2
+
+def test_column_means_skip_nulls_without_warnings():
+    values = np.array([[1.0, np.nan], [3.0, np.nan]])
+    
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        means = column_means(values)
+    
+    assert means[0] == 2.0
+    assert np.isnan(means[1])